@@ -0,0 +1,165 @@
+from pathlib import Path
+import json
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+
+SUMMARY_LEVELS = ["participant", "block", "color_mode"]
+
+
+def load_trial_data(data_folder: Path = Path("data")) -> pd.DataFrame:
+    """
+    Loading all trial records saved by the experiment as
+    data/<participant>/<block>/<trial_id>.json into a single data frame.
+    Inter-trial intervals and calibration results are skipped.
+    """
+    records = []
+    for participant_path in sorted(Path(data_folder).iterdir()):
+        if not participant_path.is_dir():
+            continue
+        for block_path in sorted(participant_path.iterdir()):
+            if not block_path.is_dir():
+                continue
+            if block_path.name.startswith("calibration_"):
+                continue
+            if block_path.name.endswith("inter_trial_intervals"):
+                continue
+            for trial_file in sorted(block_path.glob("*.json")):
+                with open(trial_file, "r") as f:
+                    info = json.load(f)
+                if "trial_id" not in info:
+                    continue
+                info["participant"] = participant_path.name
+                info["block"] = block_path.name
+                records.append(info)
+
+    return pd.DataFrame.from_records(records)
+
+
+def _get_stimulus_interval(data: pd.DataFrame) -> pd.Series:
+    """
+    The interval ("I" or "II") containing the stimulus in 2IFC records.
+    Two_Interval_DCM_Trial stores it as `stimulus_interval`; in records
+    saved before, the interval order is encoded in the trial id suffix
+    ("_stim_empty" or "_empty_stim") of the final record of a 2IFC trial.
+    """
+    trial_ids = data["trial_id"].astype(str)
+    stimulus_interval = pd.Series(np.nan, index=data.index, dtype=object)
+    stimulus_interval[trial_ids.str.endswith("_stim_empty")] = "I"
+    stimulus_interval[trial_ids.str.endswith("_empty_stim")] = "II"
+    if "stimulus_interval" in data.columns:
+        stimulus_interval = data["stimulus_interval"].where(
+            data["stimulus_interval"].isin(["I", "II"]), stimulus_interval
+        )
+    return stimulus_interval
+
+
+def compute_detection_summary(
+    data: pd.DataFrame, levels: list = SUMMARY_LEVELS
+) -> pd.DataFrame:
+    """
+    Signal detection measures for yes/no detection reports in blocks with
+    hidden (catch) trials, computed for every combination of `levels`.
+
+    Hit and false alarm rates use the log-linear correction
+    (0.5 added to every cell count, 1 to every row total), so that d' and c
+    stay finite for perfect performance. Standard errors follow the
+    Gourevitch & Galanter approximation and scale with the number of
+    signal and noise trials of every group. Groups without signal or
+    without noise trials get NaN for the rate they lack, d', c and their
+    standard errors.
+    """
+    if "interval_response" in data.columns:
+        data = data[data["interval_response"].isna()]
+    data = data[data["detection_response"].isin(["yes", "no"])]
+
+    is_signal = (data["stimulus_type"] == "gabor").to_numpy()
+    is_yes = (data["detection_response"] == "yes").to_numpy()
+    counts = pd.DataFrame(
+        {
+            "hits": is_signal & is_yes,
+            "misses": is_signal & ~is_yes,
+            "false_alarms": ~is_signal & is_yes,
+            "correct_rejections": ~is_signal & ~is_yes,
+        },
+        index=data.index,
+    )
+    for level in levels:
+        counts[level] = data[level].to_numpy()
+    summary = counts.groupby(levels).sum().astype(int)
+
+    n_signal = (summary["hits"] + summary["misses"]).to_numpy()
+    n_noise = (summary["false_alarms"] + summary["correct_rejections"]).to_numpy()
+    hit_rate = np.where(
+        n_signal > 0, (summary["hits"].to_numpy() + 0.5) / (n_signal + 1), np.nan
+    )
+    false_alarm_rate = np.where(
+        n_noise > 0, (summary["false_alarms"].to_numpy() + 0.5) / (n_noise + 1), np.nan
+    )
+
+    z_hit = norm.ppf(hit_rate)
+    z_false_alarm = norm.ppf(false_alarm_rate)
+    variance_z_hit = hit_rate * (1 - hit_rate) / ((n_signal + 1) * norm.pdf(z_hit) ** 2)
+    variance_z_false_alarm = (
+        false_alarm_rate
+        * (1 - false_alarm_rate)
+        / ((n_noise + 1) * norm.pdf(z_false_alarm) ** 2)
+    )
+
+    summary["n_signal"] = n_signal
+    summary["n_noise"] = n_noise
+    summary["hit_rate"] = hit_rate
+    summary["false_alarm_rate"] = false_alarm_rate
+    summary["d_prime"] = z_hit - z_false_alarm
+    summary["d_prime_se"] = np.sqrt(variance_z_hit + variance_z_false_alarm)
+    summary["criterion"] = -(z_hit + z_false_alarm) / 2
+    summary["criterion_se"] = summary["d_prime_se"] / 2
+
+    return summary
+
+
+def compute_2ifc_summary(
+    data: pd.DataFrame, levels: list = SUMMARY_LEVELS
+) -> pd.DataFrame:
+    """
+    Percent correct for interval choices in 2IFC blocks, computed for every
+    combination of `levels`, with its binomial standard error and the
+    corresponding 2AFC sensitivity d' = sqrt(2) * z(pc).
+    Percent correct is log-linear corrected before the z-transform.
+    """
+    if "interval_response" not in data.columns:
+        return pd.DataFrame()
+    data = data[data["interval_response"].isin(["I", "II"])]
+
+    stimulus_interval = _get_stimulus_interval(data)
+
+    counts = pd.DataFrame(
+        {
+            "correct": (data["interval_response"] == stimulus_interval).to_numpy(),
+            "n_trials": np.ones(len(data), dtype=int),
+        },
+        index=data.index,
+    )
+    for level in levels:
+        counts[level] = data[level].to_numpy()
+    summary = counts.groupby(levels).sum().astype(int)
+
+    n_trials = summary["n_trials"].to_numpy()
+    percent_correct = summary["correct"].to_numpy() / n_trials
+    corrected_percent_correct = (summary["correct"].to_numpy() + 0.5) / (n_trials + 1)
+
+    summary["percent_correct"] = percent_correct
+    summary["percent_correct_se"] = np.sqrt(
+        percent_correct * (1 - percent_correct) / n_trials
+    )
+    summary["d_prime"] = np.sqrt(2) * norm.ppf(corrected_percent_correct)
+
+    return summary
+
+
+if __name__ == "__main__":
+    trial_data = load_trial_data(Path("data"))
+    print(compute_detection_summary(trial_data))
+    print(compute_2ifc_summary(trial_data))
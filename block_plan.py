@@ -0,0 +1,106 @@
+from pathlib import Path
+import zlib
+
+import numpy as np
+
+# one row per trial; "stimulus_interval" is empty for single-interval blocks
+BLOCK_PLAN_DTYPE = np.dtype(
+    [
+        ("trial", np.int32),
+        ("alpha", np.float64),
+        ("color_mode", "U6"),
+        ("left_color", "U5"),
+        ("right_color", "U5"),
+        ("stimulus_orientation", "U5"),
+        ("stimulus_onset", np.int32),
+        ("stimulus_duration", np.int32),
+        ("is_hidden", np.bool_),
+        ("stimulus_interval", "U2"),
+        ("iti_duration", np.int32),
+    ]
+)
+
+
+def get_block_rng(session_seed: int, block_code: str) -> np.random.Generator:
+    """
+    Generator of one block, derived from the session seed and the block code,
+    so a block can be reproduced independently of the blocks run before it.
+    """
+    return np.random.default_rng([session_seed, zlib.crc32(block_code.encode())])
+
+
+def draw_color_modes(
+    session_seed: int, block_code: str, choices: list, n_trials: int
+) -> list:
+    """
+    Color modes of a block drawn from the block's generator (see
+    get_block_rng), so a resumed session repeats them. A stream separate
+    from the one of the block plan is used, so the plan is not affected.
+    """
+    rng = get_block_rng(session_seed, f"{block_code}_color_modes")
+    return [str(color_mode) for color_mode in rng.choice(choices, size=n_trials)]
+
+
+def make_block_plan(
+    rng: np.random.Generator,
+    alphas: list,
+    color_modes: list,
+    stimulus_onset_limits: tuple,
+    stimulus_duration: int,
+    iti_duration_limits: tuple,
+    hidden_trial_ratio: float = 0.0,
+    is_constant_stim: bool = False,
+    trial_duration: int | None = None,
+    is_two_interval: bool = False,
+) -> np.ndarray:
+    """
+    Drawing all random choices of a block at once.
+
+    Onsets and ITI durations are drawn uniformly from the inclusive frame
+    limits (as random.randint). Fusion trials get red and green on a random
+    side each; a trial is hidden with probability `hidden_trial_ratio`.
+    With `is_constant_stim` the stimulus spans the whole `trial_duration`.
+    For two-interval blocks `stimulus_interval` is "I" or "II".
+    """
+    n_trials = len(alphas)
+    if len(color_modes) != n_trials:
+        raise ValueError("alphas and color_modes should have the same length")
+
+    plan = np.zeros(n_trials, dtype=BLOCK_PLAN_DTYPE)
+    plan["trial"] = np.arange(n_trials)
+    plan["alpha"] = alphas
+    plan["color_mode"] = color_modes
+
+    color_modes = np.asarray(color_modes)
+    is_fusion = color_modes == "fusion"
+    is_red_left = rng.random(n_trials) < 0.5
+    plan["left_color"] = np.where(is_fusion, np.where(is_red_left, "red", "green"), color_modes)
+    plan["right_color"] = np.where(is_fusion, np.where(is_red_left, "green", "red"), color_modes)
+
+    plan["stimulus_orientation"] = np.where(rng.random(n_trials) < 0.5, "left", "right")
+
+    if is_constant_stim:
+        plan["stimulus_onset"] = 0
+        plan["stimulus_duration"] = trial_duration
+    else:
+        plan["stimulus_onset"] = rng.integers(
+            stimulus_onset_limits[0], stimulus_onset_limits[1], n_trials, endpoint=True
+        )
+        plan["stimulus_duration"] = stimulus_duration
+
+    plan["is_hidden"] = rng.random(n_trials) < hidden_trial_ratio
+    if is_two_interval:
+        plan["stimulus_interval"] = np.where(rng.random(n_trials) < 0.5, "I", "II")
+    plan["iti_duration"] = rng.integers(
+        iti_duration_limits[0], iti_duration_limits[1], n_trials, endpoint=True
+    )
+    return plan
+
+
+def save_block_plan(plan: np.ndarray, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(path, plan, allow_pickle=False)
+
+
+def load_block_plan(path: Path) -> np.ndarray:
+    return np.load(path, allow_pickle=False)
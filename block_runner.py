@@ -0,0 +1,545 @@
+from pathlib import Path
+import json
+
+import numpy as np
+from psychopy import visual, event, colors, core
+
+from misc import (
+    Parameters,
+    Color_Table,
+    Calibrator,
+    check_beta_plot,
+    measure_frame_period,
+)
+from trials import (
+    DCM_Trial,
+    Two_Interval_DCM_Trial,
+    Dichoptic_Text,
+    Dichoptic_Slider,
+    Adjustment_DCM_Trial,
+    DCM_Stimulus_Prefetcher,
+    Trial_Factory,
+)
+from timeline import Block_Timeline
+from realtime import Real_Time_Mode
+from idle import Idle_Screen
+from draw_list import Draw_List
+from session_log import session_log
+
+STIMULUS_ORIS = [45, 135]  # "left" and "right" orientations of DCM_Trial
+
+
+def build_planned_trial(
+    trial_factory: Trial_Factory,
+    params: Parameters,
+    block_code: str,
+    data_folder: Path,
+    itrial: int,
+    trial_plan: np.void,
+    detection_info: dict | None,
+    discrimination_info: dict | None,
+    termination_buttons: list | None,
+) -> DCM_Trial:
+    """The trial of one block plan row; a Two_Interval_DCM_Trial if the row has a stimulus interval"""
+    trial_kwargs = {}
+    if trial_plan["stimulus_interval"] != "":
+        trial_kwargs = {
+            "trial_class": Two_Interval_DCM_Trial,
+            "stimulus_interval": str(trial_plan["stimulus_interval"]),
+            "inter_interval_duration": trial_factory.inter_interval_duration,
+            "interval_probe_params": params.interval_probe_params,
+        }
+    return trial_factory.get_dcm_trial(
+        index=str(f"{block_code}_{itrial}"),
+        data_folder=data_folder / block_code,
+        alpha=float(trial_plan["alpha"]),
+        color_mode=str(trial_plan["color_mode"]),
+        stimulus_orientation=str(trial_plan["stimulus_orientation"]),
+        stimulus_onset=int(trial_plan["stimulus_onset"]),
+        stimulus_duration=int(trial_plan["stimulus_duration"]),
+        detection_judgement_routine=detection_info,
+        discrimination_judgement_routine=discrimination_info,
+        termination_buttons=termination_buttons,
+        **trial_kwargs,
+    )
+
+
+def run_planned_block(
+    window: visual.Window,
+    params: Parameters,
+    trial_factory: Trial_Factory,
+    color_table: Color_Table,
+    block_code: str,
+    data_folder: Path,
+    plan: np.ndarray,
+    detection_info: dict | None,
+    discrimination_info: dict | None,
+    termination_buttons: list | None,
+    is_iti_included: bool,
+    is_background_adjusted: bool,
+    real_time_mode=None,
+    save_record=None,
+) -> Block_Timeline:
+    """
+    Running the planned trials on one frame-locked Block_Timeline: every
+    trial is built and every record saved in the spare time of the
+    non-critical frames (response screens, ITIs, filler) before it.
+    Records are written by `save_record(path, info)` if given (e.g. sent
+    to another process), by the trials otherwise.
+    """
+    timeline = Block_Timeline(
+        window=window,
+        frame_duration=params.frame_duration__s,
+        filler=Draw_List("filler", trial_factory.dichoptic_canvas),
+        real_time_mode=real_time_mode,
+    )
+    prefetcher = DCM_Stimulus_Prefetcher(
+        stimulus_source=trial_factory.stimulus_source,
+        square_size=trial_factory.square_size,
+        gamma=trial_factory.gamma,
+        beta_polynomial=trial_factory.beta_polynomial,
+        color_table=color_table,
+    )
+    prefetcher.prefetch(alphas=list(np.unique(plan["alpha"])), oris=STIMULUS_ORIS)
+
+    def save(record):
+        if save_record is None:
+            return record.save_data
+        return lambda: save_record(record.record_path, record.info)
+
+    def build_trial(itrial: int):
+        trial = build_planned_trial(
+            trial_factory=trial_factory,
+            params=params,
+            block_code=block_code,
+            data_folder=data_folder,
+            itrial=itrial,
+            trial_plan=plan[itrial],
+            detection_info=detection_info,
+            discrimination_info=discrimination_info,
+            termination_buttons=termination_buttons,
+        )
+        # the stimuli are prepared in a separate task, so each stays within a frame budget
+        timeline.defer(
+            lambda: schedule_trial(itrial, trial), name=f"prepare_{block_code}_{itrial}"
+        )
+
+    def schedule_trial(itrial: int, trial: DCM_Trial):
+        trial_plan = plan[itrial]
+        alpha = float(trial_plan["alpha"])
+        trial.process_stimuli(
+            processed_images=prefetcher.get(alpha=alpha, ori=trial.ori),
+            square_colors={
+                "left": str(trial_plan["left_color"]),
+                "right": str(trial_plan["right_color"]),
+            },
+        )
+
+        def start_trial():
+            if is_background_adjusted:
+                window.setColor(color_table.get_background_color(alpha))
+
+        epochs = trial.get_epochs(
+            hide_stimulus=bool(trial_plan["is_hidden"]),
+            on_start=start_trial,
+            on_end=lambda: timeline.defer(save(trial), name=f"save_{trial.index}"),
+        )
+        # the next trial is built once the stimulus epoch is over, outside critical frames
+        end_stimulus_epoch = epochs[0].on_end
+
+        def end_stimulus(key, n_frames):
+            end_stimulus_epoch(key, n_frames)
+            if itrial + 1 < len(plan):
+                timeline.defer(
+                    lambda: build_trial(itrial + 1), name=f"build_{block_code}_{itrial + 1}"
+                )
+
+        epochs[0].on_end = end_stimulus
+        for epoch in epochs:
+            timeline.append(epoch)
+
+        if is_iti_included:
+            iti = trial_factory.get_inter_trial_interval(
+                index=str(f"{block_code}_{itrial}"),
+                data_folder=data_folder / "inter_trial_intervals",
+                duration=int(trial_plan["iti_duration"]),
+            )
+            timeline.append(
+                iti.get_epoch(
+                    on_end=lambda: timeline.defer(save(iti), name=f"save_iti_{itrial}")
+                )
+            )
+
+    if len(plan) > 0:
+        timeline.defer(lambda: build_trial(0), name=f"build_{block_code}_0")
+    timeline.run()
+    prefetcher.close()
+    return timeline
+
+
+def show_text(
+    window: visual.Window,
+    params: Parameters,
+    trial_factory: Trial_Factory,
+    text: str,
+    text_mode: str,
+    termination_buttons: list,
+) -> dict:
+    """Waiting on an idle screen until a termination button; returns its CPU usage report"""
+    if text_mode not in ["fusion", "default"]:
+        raise ValueError("text mode can be either fusion or default")
+
+    stimuli = []
+    if text_mode == "default":
+        text_stim = visual.TextBox2(
+            units="pix",
+            win=window,
+            alignment="center",
+            text=text,
+            size=[
+                params.screen_params["resolution_x__px"],
+                params.screen_params["resolution_y__px"],
+            ],
+            letterHeight=int(0.2 * params.visual_params["square_size__degrees"] * params.px_per_deg),
+            pos=(0, 0),
+            color=params.frame_color,
+        )
+        stimuli.append(text_stim)
+    elif text_mode == "fusion":
+        text_builder = Dichoptic_Text(
+            **trial_factory.geometry,
+            termination_buttons=termination_buttons,
+        )
+        text_builder.process_stimuli(text=text)
+        stimuli = Draw_List("text", text_builder.stimuli, text_builder.dichoptic_canvas)
+
+    def poll():
+        keys_pressed = event.getKeys()
+        if any([button in keys_pressed for button in termination_buttons]):
+            return keys_pressed[0]
+        return None
+
+    screen = Idle_Screen(window=window, name=f"text_{text_mode}")
+    screen.wait(draw_list=stimuli, poll=poll)
+    return screen.report
+
+
+def write_record(path: Path, info: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(info, f, indent=4)
+
+
+class Renderer:
+    """
+    Everything that draws on the window: planned blocks, single trials of
+    the trial-by-trial blocks (stereo, slider, adjustment, staircases),
+    calibration rounds and text screens. Experiment uses it directly or,
+    with a render process, through Render_Client, which runs it in the
+    other process; arguments and results are plain picklable values and
+    the block logic (staircases, QUEST+, calibration fits) stays with the
+    caller. Records are written by `save_record(path, info)`.
+    """
+
+    def __init__(self, params: Parameters, real_time: bool = False, save_record=None):
+        self.params = params
+        self.save_record = write_record if save_record is None else save_record
+
+        self.window = visual.Window(fullscr=True, color=params.background_color_0)
+        self.mouse = event.Mouse(visible=False)
+        self.mouse.setExclusive(True)
+        # measured once, so every calibration level flickers with the same phase timing
+        self.frame_period = measure_frame_period(
+            window=self.window, refresh_rate=params.screen_params["refresh_rate__hz"]
+        )
+
+        def default_beta_function(_anything):
+            return 1.0
+
+        self.beta_polynomial = default_beta_function
+        self.kappa_polynomial = default_beta_function
+        self.color_table = Color_Table(
+            gamma=params.visual_params["full_saturation_value"],
+            beta_polynomial=self.beta_polynomial,
+            kappa_polynomial=self.kappa_polynomial,
+        )
+        self.trial_factory = Trial_Factory(
+            window=self.window,
+            params=params,
+            beta_polynomial=self.beta_polynomial,
+            color_table=self.color_table,
+        )
+        self._prefetcher = None
+
+        # stimulus frames run with GC deferred and raised priority (see realtime.py)
+        self.real_time_mode = None
+        if real_time:
+            self.real_time_mode = Real_Time_Mode()
+            self.real_time_mode.activate()
+
+    def set_calibration(self, beta_polynomial=None, kappa_polynomial=None):
+        """Polynomials given as None are kept"""
+        if beta_polynomial is not None:
+            self.beta_polynomial = beta_polynomial
+        if kappa_polynomial is not None:
+            self.kappa_polynomial = kappa_polynomial
+        # colors for the whole 8-bit alpha grid, shared by all blocks
+        self.color_table = Color_Table(
+            gamma=self.params.visual_params["full_saturation_value"],
+            beta_polynomial=self.beta_polynomial,
+            kappa_polynomial=self.kappa_polynomial,
+        )
+        self.trial_factory.set_calibration(
+            beta_polynomial=self.beta_polynomial, color_table=self.color_table
+        )
+
+    def _run_trial(self, trial):
+        """Running the trial as a critical epoch of the real-time mode, then housekeeping"""
+        if self.real_time_mode is None:
+            trial.run()
+            return
+        self.real_time_mode.enter_critical()
+        try:
+            trial.run()
+        finally:
+            self.real_time_mode.leave_critical()
+        self.real_time_mode.housekeeping()
+
+    def _wait_inter_trial_interval(self, index: str, data_folder: Path):
+        self.trial_factory.get_inter_trial_interval(
+            index=index, data_folder=data_folder
+        ).wait()
+
+    def run_block(self, **spec) -> dict:
+        """Running a planned block (see run_planned_block); returns the timeline log"""
+        n_constructed = len(self.trial_factory.construction_times)
+        log = run_planned_block(
+            window=self.window,
+            params=self.params,
+            trial_factory=self.trial_factory,
+            color_table=self.color_table,
+            real_time_mode=self.real_time_mode,
+            save_record=self.save_record,
+            **spec,
+        ).get_log()
+        log["trial_construction"] = self.trial_factory.get_construction_stats(
+            start=n_constructed
+        )
+        return log
+
+    def display_text(self, text: str, text_mode: str, termination_buttons: list) -> dict:
+        return show_text(
+            window=self.window,
+            params=self.params,
+            trial_factory=self.trial_factory,
+            text=text,
+            text_mode=text_mode,
+            termination_buttons=termination_buttons,
+        )
+
+    def run_stereo_trial(self, index: str, data_folder: Path, stimulus_direction: str) -> dict:
+        trial = self.trial_factory.get_stereo_trial(
+            index=index,
+            stimulus_index=stimulus_direction,
+            data_folder=data_folder,
+            stimulus_source=[
+                self.params.stimuli_codes[f"E_{stimulus_direction}_{side}"]
+                for side in ["left", "right"]
+            ],
+            termination_buttons=["left", "right", "up", "down"],
+        )
+        trial.process_stimuli()
+        self._run_trial(trial)
+        self.save_record(trial.record_path, trial.info)
+        return trial.get_data()
+
+    def start_prefetching(self, alphas: list):
+        """Preparing the images of `alphas` in the background for the following run_dcm_trial calls"""
+        self.stop_prefetching()
+        self._prefetcher = DCM_Stimulus_Prefetcher(
+            stimulus_source=self.trial_factory.stimulus_source,
+            square_size=self.trial_factory.square_size,
+            gamma=self.trial_factory.gamma,
+            beta_polynomial=self.beta_polynomial,
+            color_table=self.color_table,
+        )
+        self._prefetcher.prefetch(alphas=alphas, oris=STIMULUS_ORIS)
+
+    def stop_prefetching(self):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+
+    def run_dcm_trial(
+        self,
+        index: str,
+        data_folder: Path,
+        alpha: float,
+        stimulus_orientation: str,
+        iti_data_folder: Path,
+        prefetch_alphas: list | None = None,
+    ) -> dict:
+        """
+        A fusion trial with a detection report, followed by an ITI; returns
+        the trial info. With prefetching started, the images come from the
+        prefetcher; once the stimulus has been shown, it keeps only
+        `prefetch_alphas` (the alphas that may come next) and prepares them
+        during the ITI, so no images are processed during the stimulus.
+        """
+        trial = self.trial_factory.get_dcm_trial(
+            index=index,
+            data_folder=data_folder,
+            alpha=alpha,
+            color_mode="fusion",
+            stimulus_orientation=stimulus_orientation,
+            stimulus_onset=self.trial_factory.draw_stimulus_onset(),
+            detection_judgement_routine=self.params.detection_report_params,
+        )
+        if self._prefetcher is None:
+            trial.process_stimuli()
+        else:
+            trial.process_stimuli(
+                processed_images=self._prefetcher.get(alpha=alpha, ori=trial.ori)
+            )
+            self._prefetcher.wait()
+
+        self._run_trial(trial)
+        if self._prefetcher is not None and prefetch_alphas is not None:
+            self._prefetcher.retain(alphas=prefetch_alphas)
+            self._prefetcher.prefetch(alphas=prefetch_alphas, oris=STIMULUS_ORIS)
+        trial.collect_responses()
+        self.save_record(trial.record_path, trial.info)
+        self._wait_inter_trial_interval(index=index, data_folder=iti_data_folder)
+        return trial.get_data()
+
+    def run_slider_trial(
+        self,
+        index: str,
+        data_folder: Path,
+        alpha: float,
+        stimulus_orientation: str,
+        iti_data_folder: Path,
+    ) -> tuple[float, bool]:
+        """A detection trial followed by the slider; returns the slider alpha and whether the block is finished"""
+        gamma = self.params.visual_params["full_saturation_value"]
+        trial = self.trial_factory.get_dcm_trial(
+            index=index,
+            data_folder=data_folder,
+            alpha=alpha,
+            color_mode="fusion",
+            stimulus_orientation=stimulus_orientation,
+            stimulus_onset=self.trial_factory.draw_stimulus_onset(),
+            detection_judgement_routine=self.params.detection_report_params,
+        )
+        slider_menu = Dichoptic_Slider(
+            scale=[int(0.625 * 100 * gamma), int(100 * gamma)],
+            current_value=alpha * 100,
+            **self.trial_factory.geometry,
+            termination_buttons=["space"],
+            block_finish_buttons=["q"],
+            increase_buttons=["o"],
+            decrease_buttons=["m"],
+        )
+
+        trial.process_stimuli()
+        slider_menu.process_stimuli()
+        self._run_trial(trial)
+        trial.collect_responses()
+        alpha = slider_menu.run() / 100
+        self.save_record(trial.record_path, trial.info)
+
+        is_block_finished = slider_menu.get_data()["block_finish_called"] == "yes"
+        if not is_block_finished:
+            self._wait_inter_trial_interval(index=index, data_folder=iti_data_folder)
+        return alpha, is_block_finished
+
+    def run_adjustment(
+        self,
+        index: str,
+        data_folder: Path,
+        alpha: float,
+        stimulus_orientation: str,
+        adjustment_buttons: list,
+    ) -> float:
+        """Continuous adjustment of alpha (Adjustment_DCM_Trial); returns the confirmed alpha"""
+        adj_trial = self.trial_factory.get_dcm_trial(
+            index=index,
+            data_folder=data_folder,
+            alpha=alpha,
+            color_mode="fusion",
+            stimulus_orientation=stimulus_orientation,
+            stimulus_onset=0,
+            stimulus_duration=99999,
+            max_trial_duration=99999,
+            termination_buttons=["space"],
+            trial_class=Adjustment_DCM_Trial,
+        )
+        adj_trial.process_stimuli()
+        return adj_trial.run(
+            adjustment_buttons=adjustment_buttons,
+            adjustment_value=0.002,
+            kappa_polynomial=self.kappa_polynomial,
+        )
+
+    def run_calibration_level(
+        self,
+        calibration_type: str,
+        alpha: float,
+        beta_0: float,
+        beta_0_jitter: float,
+        rng: np.random.Generator | None = None,
+    ) -> tuple[float, dict]:
+        """One flicker calibration round at `alpha`; returns beta and the flicker log"""
+        gamma = self.params.visual_params["full_saturation_value"]
+        if calibration_type == "DCF_colors":
+            color_A = colors.Color([gamma, alpha, 0], space="rgb1") #red
+            color_B = colors.Color([alpha, gamma, 0], space="rgb1") #green
+        if calibration_type == "background":
+            color_A = colors.Color([gamma, alpha, 0], space="rgb1") #red
+            color_B = colors.Color([gamma, gamma, gamma], space="rgb1") #blue
+
+        calibrator = Calibrator(
+            window=self.window,
+            refresh_rate=self.params.screen_params["refresh_rate__hz"],
+            mouse=self.mouse,
+            beta_0=beta_0,
+            beta_increment=self.params.calibration_params["beta_increment"],
+            calibration_type=self.params.calibration_params["calibration_type"],
+            A_color_rgb1=color_A,
+            B_color_rgb1=color_B,
+            field_size=3 * self.params.square_size__px,
+            background_color=self.params.background_color_0,
+            flicker_frequency=self.params.calibration_params["flicker_frequency__hz"],
+            beta_0_jitter=beta_0_jitter,
+            frame_period=self.frame_period,
+            rng=rng,
+        )
+        beta = calibrator.run_calibration_trial()
+
+        self.window.flip()
+        core.wait(self.params.calibration_params["inter_round_waiting__s"])
+        return beta, calibrator.flicker_log
+
+    def check_calibration(self, betas: dict) -> tuple[bool, np.poly1d]:
+        """The calibration plot with the approve/repeat buttons (see check_beta_plot)"""
+        return check_beta_plot(
+            window=self.window,
+            mouse=self.mouse,
+            field_size=3 * self.params.square_size__px,
+            gamma=self.params.visual_params["full_saturation_value"],
+            alpha_decrement=self.params.calibration_params["alpha_decrement"],
+            betas=betas,
+        )
+
+    def close(self) -> dict | None:
+        """Closing the window; returns the report of the real-time mode, if active"""
+        self.stop_prefetching()
+        session_log.info(
+            "trial_construction", **self.trial_factory.get_construction_stats()
+        )
+        report = None
+        if self.real_time_mode is not None:
+            self.real_time_mode.deactivate()
+            report = self.real_time_mode.get_report()
+        self.window.close()
+        return report
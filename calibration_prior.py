@@ -0,0 +1,56 @@
+from pathlib import Path
+import math
+
+import numpy as np
+
+from misc import Calibration
+
+
+def build_calibration_prior(
+    data_folder: Path,
+    calibration_type: str,
+    monitor: dict,
+    refresh_rate: int,
+    gamma: float,
+    excluded_participant: str | None = None,
+    max_age__days: float = math.inf,
+) -> tuple[np.poly1d, float] | None:
+    """
+    Population prior of beta(alpha) built from the calibrations of
+    `calibration_type` stored in data_folder (one folder per participant)
+    that are valid for the monitor, refresh rate and gamma of the session
+    (see Calibration.is_valid_for).
+
+    Returns the quadratic fit of the pooled betas and the SD of the
+    residuals around it, or None if there are too few stored calibrations.
+    """
+    alphas = []
+    betas = []
+    for calibration_path in sorted(
+        Path(data_folder).glob(
+            f"*/calibration_{calibration_type}/calibration_{calibration_type}_store.json"
+        )
+    ):
+        participant = calibration_path.parent.parent.name
+        if participant == excluded_participant:
+            continue
+        calibration = Calibration.load(calibration_path)
+        if not calibration.is_valid_for(
+            monitor=monitor,
+            refresh_rate=refresh_rate,
+            gamma=gamma,
+            max_age__days=max_age__days,
+        ):
+            continue
+        alphas += calibration.alphas
+        betas += calibration.betas
+
+    if len(alphas) < 4:
+        return None
+
+    alphas = np.array(alphas)
+    betas = np.array(betas)
+    polynomial = np.poly1d(np.polyfit(x=alphas, y=betas, deg=2))
+    residual_sd = float(np.std(betas - polynomial(alphas)))
+
+    return polynomial, residual_sd
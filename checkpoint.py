@@ -0,0 +1,54 @@
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+import json
+import os
+
+
+@dataclass
+class Session_Checkpoint:
+    """
+    Progress of a session, saved after every block so that a crashed
+    session can be resumed (see Experiment(..., resume=True)).
+
+    session_seed: seed of all block plans, so the remaining blocks are
+        the ones the session would have run
+    completed_steps: session steps (blocks and the text screens before
+        them) in order, as {"step": name, "result": return value}
+    calibration: polynomial coefficients per calibration type
+    staircase_threshold: result of the last staircase block, if any
+    """
+
+    session_seed: int
+    completed_steps: list = field(default_factory=list)
+    calibration: dict = field(default_factory=dict)
+    staircase_threshold: float | None = None
+    timestamp: str = ""
+
+    @staticmethod
+    def get_path(participant_path: Path) -> Path:
+        return participant_path / "checkpoint.json"
+
+    def get_completed_results(self) -> dict:
+        """Result of every completed step by (step name, occurrence of that name)"""
+        results = {}
+        occurrences = {}
+        for step in self.completed_steps:
+            occurrence = occurrences.get(step["step"], 0)
+            occurrences[step["step"]] = occurrence + 1
+            results[(step["step"], occurrence)] = step["result"]
+        return results
+
+    def save(self, path: Path):
+        # written to a temporary file first, so a crash never leaves a partial checkpoint
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "w") as f:
+            json.dump(asdict(self), f, indent=4, default=float)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: Path):
+        with open(path, "r") as f:
+            return cls(**json.load(f))
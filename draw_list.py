@@ -0,0 +1,86 @@
+import time
+
+
+class Draw_List:
+    """
+    A draw list compiled once from its layers (e.g. supporting visuals,
+    stimuli, dichoptic canvas), drawn in layer order. An object present in
+    several layers is kept at its first position only, so nothing is
+    drawn twice in a frame.
+    """
+
+    __slots__ = ("name", "objects", "n_duplicates")
+
+    def __init__(self, name: str, *layers):
+        self.name = name
+        seen = set()
+        objects = []
+        n_duplicates = 0
+        for layer in layers:
+            for visual_object in layer:
+                if id(visual_object) in seen:
+                    n_duplicates += 1
+                    continue
+                seen.add(id(visual_object))
+                objects.append(visual_object)
+        self.objects = tuple(objects)
+        self.n_duplicates = n_duplicates
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def __repr__(self) -> str:
+        return f"Draw_List({self.name!r}, {len(self.objects)} objects)"
+
+    def variant(self, name: str, exclude: list) -> "Draw_List":
+        """Epoch-specific variant: the same order without the `exclude` objects"""
+        excluded = {id(visual_object) for visual_object in exclude}
+        return Draw_List(
+            name,
+            [
+                visual_object
+                for visual_object in self.objects
+                if id(visual_object) not in excluded
+            ],
+        )
+
+    def draw(self) -> int:
+        for visual_object in self.objects:
+            visual_object.draw()
+        return len(self.objects)
+
+
+class Draw_Metrics:
+    """Draw calls and draw time of every frame drawn through `draw`"""
+
+    def __init__(self):
+        self.draw_calls = []
+        self.draw_times = []
+        self.n_uncompiled_frames = 0
+
+    def draw(self, draw_list):
+        """Drawing a Draw_List or a plain list of visual objects"""
+        start = time.perf_counter()
+        if isinstance(draw_list, Draw_List):
+            n_draw_calls = draw_list.draw()
+        else:
+            for visual_object in draw_list:
+                visual_object.draw()
+            n_draw_calls = len(draw_list)
+            self.n_uncompiled_frames += 1
+        self.draw_times.append(time.perf_counter() - start)
+        self.draw_calls.append(n_draw_calls)
+
+    def get_summary(self) -> dict:
+        n_frames = len(self.draw_calls)
+        return {
+            "n_drawn_frames": n_frames,
+            "n_uncompiled_frames": self.n_uncompiled_frames,
+            "draw_calls_total": sum(self.draw_calls),
+            "draw_calls_max": max(self.draw_calls) if n_frames > 0 else None,
+            "draw_time_mean__s": sum(self.draw_times) / n_frames if n_frames > 0 else None,
+            "draw_time_max__s": max(self.draw_times) if n_frames > 0 else None,
+        }
@@ -1,112 +1,294 @@
+from datetime import datetime
+import functools
+import inspect
 import json
 import random
-import pickle
 
 import numpy as np
-from psychopy import visual, colors, event, core
-
-from trials import (
-    DCM_Trial,
-    Stereo_Trial,
-    Inter_Trial_Interval,
-    Dichoptic_Text,
-    Dichoptic_Slider,
-    Adjustment_DCM_Trial,
+
+from misc import (
+    Participant,
+    Parameters,
+    Calibration,
+    Color_Table,
+    get_calibration_fit_band,
+    get_outlying_calibration_points,
 )
-from misc import Participant, Parameters, Calibrator, check_beta_plot
+from staircase import Staircase, Interleaved_Staircase
+from quest import Quest_Plus
+from calibration_prior import build_calibration_prior
+from block_plan import get_block_rng, make_block_plan, save_block_plan
+from timeline import save_timeline_log
+from block_runner import Renderer
+from render_process import Render_Client
+from idle import get_idle_summary, save_idle_log
+from session_log import session_log
+from checkpoint import Session_Checkpoint
+
+
+def _session_step(is_block: bool = True):
+    """
+    Makes an Experiment method a step of the session script. Completed
+    steps are recorded in the checkpoint (saved after every block); when
+    resuming, a step completed before the crash is skipped and returns
+    its recorded result. Steps are identified by the method, its block
+    code / calibration type / text and how often that step occurred.
+    """
+
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def run_step(self, *args, **kwargs):
+            arguments = signature.bind(self, *args, **kwargs).arguments
+            label = next(
+                (
+                    str(arguments[name])
+                    for name in ["block_code", "calibration_type", "text"]
+                    if name in arguments
+                ),
+                "",
+            )
+            return self._run_step(
+                step=f"{method.__name__}:{label}",
+                run=lambda: method(self, *args, **kwargs),
+                is_block=is_block,
+            )
+
+        return run_step
+
+    return decorator
 
 
 class Experiment:
-    def __init__(self, participant: Participant, params: Parameters):
+    """
+    The window is owned by a Renderer (block_runner.py), which runs the
+    planned blocks, single trials, calibration rounds and text screens;
+    the block logic (staircases, QUEST+, calibration fits, checkpoints)
+    stays here. With `render_process`, the Renderer runs in a separate
+    process (see render_process.py) and this process writes the data.
+
+    With `resume`, the session continues from the checkpoint of the
+    participant (see checkpoint.py): the session seed, calibration and
+    staircase threshold are restored, and the blocks completed before
+    (with the text screens preceding them) are skipped.
+    """
+
+    def __init__(
+        self,
+        participant: Participant,
+        params: Parameters,
+        session_seed: int | None = None,
+        real_time: bool = False,
+        render_process: bool = False,
+        resume: bool = False,
+    ):
         self.participant = participant
 
         self.params = params
+        self.participant.path.mkdir(parents=True, exist_ok=True)
+        session_log.start(self.participant.path / "session_log.jsonl")
+
+        checkpoint = None
+        checkpoint_path = Session_Checkpoint.get_path(self.participant.path)
+        if resume:
+            checkpoint = Session_Checkpoint.load(checkpoint_path)
+            if session_seed is not None and session_seed != checkpoint.session_seed:
+                raise ValueError("session_seed differs from the seed of the checkpoint")
+            session_seed = checkpoint.session_seed
+            session_log.info(
+                "session_resumed",
+                checkpoint=checkpoint_path,
+                n_completed_steps=len(checkpoint.completed_steps),
+            )
 
-        self.window = visual.Window(fullscr=True, color=params.background_color_0)
-        self.mouse = event.Mouse(visible=False)
-        self.mouse.setExclusive(True)
+        # every block plan is drawn from this seed, so the session can be reproduced
+        if session_seed is None:
+            session_seed = int(np.random.SeedSequence().entropy % 2**63)
+        self.session_seed = session_seed
+        session_log.info("session_seed", session_seed=session_seed)
+        with open(self.participant.path / "session_seed.json", "w") as f:
+            json.dump(
+                {"session_seed": session_seed, "timestamp": datetime.now().isoformat()},
+                f,
+                indent=4,
+            )
+
+        if render_process:
+            self.renderer = Render_Client(
+                params=params,
+                real_time=real_time,
+                log_path=self.participant.path / "render_session_log.jsonl",
+            )
+        else:
+            self.renderer = Renderer(params=params, real_time=real_time)
 
         self.betas_calibration = {}
+        self._calibration_prior = None
+        self._calibration_rng = None
 
         def default_beta_function(_anything):
             return 1.0
 
         self.beta_polynomial = default_beta_function # default polynomial;
         self.kappa_polynomial = default_beta_function 
-
-    def _insert_inter_trial_interval(self, inter_trial_interval):
-        for visual in self.canvas_DCF:
-            visual.draw()
-        self.window.flip()
-        core.wait(inter_trial_interval)
-
+        self.color_table = Color_Table(
+            gamma=params.visual_params["full_saturation_value"],
+            beta_polynomial=self.beta_polynomial,
+            kappa_polynomial=self.kappa_polynomial,
+        )
+        self.staircase_threshold = None
+        self._checkpoint_path = checkpoint_path
+        self._completed_steps = []
+        self._step_occurrences = {}
+        self._resumed_results = {}
+        self._calibration_coefficients = {}
+        if checkpoint is not None:
+            self._resumed_results = checkpoint.get_completed_results()
+            self.staircase_threshold = checkpoint.staircase_threshold
+            for calibration_type, coefficients in checkpoint.calibration.items():
+                self._set_calibration_polynomial(calibration_type, np.poly1d(coefficients))
+
+    def _save_checkpoint(self):
+        Session_Checkpoint(
+            session_seed=self.session_seed,
+            completed_steps=self._completed_steps,
+            calibration=self._calibration_coefficients,
+            staircase_threshold=self.staircase_threshold,
+            timestamp=datetime.now().isoformat(),
+        ).save(self._checkpoint_path)
+
+    def _run_step(self, step: str, run, is_block: bool):
+        """
+        Running a session step (see _session_step), or returning its result
+        if it was completed before the crash. The checkpoint is saved after
+        every block; text screens are saved with the block following them,
+        so the ones before an unfinished block are shown again on resume.
+        """
+        occurrence = self._step_occurrences.get(step, 0)
+        self._step_occurrences[step] = occurrence + 1
+        if (step, occurrence) in self._resumed_results:
+            result = self._resumed_results[(step, occurrence)]
+            session_log.info("step_skipped", step=step, occurrence=occurrence)
+        else:
+            result = run()
+        self._completed_steps.append({"step": step, "result": result})
+        if is_block:
+            self._save_checkpoint()
+            session_log.info("checkpoint_saved", step=step)
+        return result
+
+    def finish(self):
+        """
+        Closing the renderer, saving the CPU usage of the waiting
+        screens, ending the real-time mode and saving its report, and
+        closing the session log
+        """
+        report = self.renderer.close()
+        save_idle_log(self.participant.path / "idle_report.json")
+        session_log.info("waiting_screens", **get_idle_summary())
+        if report is not None:
+            with open(self.participant.path / "real_time_report.json", "w") as f:
+                json.dump(report, f, indent=4)
+            session_log.info("real_time_mode", **report)
+        session_log.close()
+
+    @_session_step()
     def run_color_contrast_calibration(
         self, calibration_type : str, n_calibration_contrasts: int, save_results: bool, 
+        reuse_valid_calibration: bool = True, adaptive: bool = False,
+        use_population_prior: bool = False,
     ):
+        """
+        adaptive: instead of visiting all n_calibration_contrasts levels,
+            start from a few evenly spread levels and add the level with the
+            widest confidence band of the quadratic fit until the band is
+            below adaptive_fit_tolerance; on rejection only the levels
+            deviating from the fit are re-measured.
+        use_population_prior: start every level from the beta predicted by
+            the calibrations of previous participants on the same setup (with a random offset
+            of +/- prior_offset_range) instead of beta_0.
+        """
         if calibration_type not in ["DCF_colors", "background"]:
             raise ValueError("Calibration type should be either 'DCF_colors' or 'background'")
-        
+
+        if reuse_valid_calibration and self._load_valid_calibration(calibration_type):
+            return
+
         contrast_levels = [i for i in range(n_calibration_contrasts)]
         random.shuffle(contrast_levels)
 
         gamma = self.params.visual_params["full_saturation_value"]
+        alpha_decrement = self.params.calibration_params["alpha_decrement"]
+
+        self._calibration_prior = None
+        # offsets of beta_0 from the prior, reproducible from the session seed
+        self._calibration_rng = get_block_rng(self.session_seed, f"calibration_{calibration_type}")
+        if use_population_prior:
+            self._calibration_prior = build_calibration_prior(
+                data_folder=self.participant.path.parent,
+                calibration_type=calibration_type,
+                monitor=dict(self.params.monitor_identity),
+                refresh_rate=self.params.screen_params["refresh_rate__hz"],
+                gamma=gamma,
+                excluded_participant=self.participant.sbj_id,
+            )
 
+        if adaptive:
+            # evenly spread starting levels, enough to estimate the fit residuals
+            n_initial_levels = min(
+                self.params.calibration_params["adaptive_initial_levels"],
+                n_calibration_contrasts,
+            )
+            levels_to_measure = np.linspace(
+                0, n_calibration_contrasts - 1, n_initial_levels
+            ).round().astype(int)
+            levels_to_measure = sorted(set(levels_to_measure.tolist()))
+            random.shuffle(levels_to_measure)
+        else:
+            levels_to_measure = contrast_levels
+
+        self.betas_calibration = {}
+        flicker_logs = {}
         is_calibration_approved = False
         while is_calibration_approved is False:
-            self.betas_calibration = {}
+            if not adaptive:
+                self.betas_calibration = {}
+                flicker_logs = {}
 
-            for icontrast in contrast_levels:
-                alpha = (
-                    gamma
-                    - self.params.calibration_params["alpha_decrement"] * icontrast
+            for icontrast in levels_to_measure:
+                beta, flicker_logs[icontrast] = self._run_calibration_level(
+                    calibration_type=calibration_type, icontrast=icontrast, gamma=gamma
                 )
-                if calibration_type == "DCF_colors":
-                    color_A = colors.Color([gamma, alpha, 0], space="rgb1") #red
-                    color_B = colors.Color([alpha, gamma, 0], space="rgb1") #green
-                if calibration_type == "background":
-                    color_A = colors.Color([gamma, alpha, 0], space="rgb1") #red
-                    color_B = colors.Color([gamma, gamma, gamma], space="rgb1") #blue
-
-                calibrator = Calibrator(
-                    window=self.window,
-                    refresh_rate=self.params.screen_params["refresh_rate__hz"],
-                    mouse=self.mouse,
-                    beta_0=self.params.calibration_params["beta_0"],
-                    beta_increment=self.params.calibration_params["beta_increment"],
-                    calibration_type=self.params.calibration_params["calibration_type"],
-                    A_color_rgb1=color_A,
-                    B_color_rgb1=color_B,
-                    field_size=3
-                    * int(
-                        self.params.visual_params["square_size__degrees"]
-                        * self.params.px_per_deg
-                    ),
-                    background_color=self.params.background_color_0,
-                )
-                beta = calibrator.run_calibration_trial()
-
-                self.window.flip()
-                core.wait(self.params.calibration_params["inter_round_waiting__s"])
+                self.betas_calibration[icontrast] = beta
 
+            while adaptive:
+                icontrast = self._get_next_calibration_level(
+                    contrast_levels=contrast_levels, gamma=gamma
+                )
+                if icontrast is None:
+                    break
+                beta, flicker_logs[icontrast] = self._run_calibration_level(
+                    calibration_type=calibration_type, icontrast=icontrast, gamma=gamma
+                )
                 self.betas_calibration[icontrast] = beta
 
-            is_calibration_approved, polynomial = check_beta_plot(
-                window=self.window,
-                mouse=self.mouse,
-                field_size=3
-                * int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                gamma=gamma,
-                alpha_decrement=self.params.calibration_params["alpha_decrement"],
-                betas=self.betas_calibration,
+            is_calibration_approved, polynomial = self.renderer.check_calibration(
+                betas=self.betas_calibration
             )
 
-        if calibration_type == "DCF_colors":
-            self.beta_polynomial = polynomial
-        if calibration_type == "background":
-            self.kappa_polynomial = polynomial #changing notation to kappa to separate from red-and-green calibration
+            if adaptive and not is_calibration_approved:
+                # re-measuring only the levels deviating from the fit
+                measured_levels = sorted(self.betas_calibration.keys())
+                outlying = get_outlying_calibration_points(
+                    alphas=[gamma - alpha_decrement * icontrast for icontrast in measured_levels],
+                    betas=[self.betas_calibration[icontrast] for icontrast in measured_levels],
+                    min_sigma=self.params.calibration_params["beta_increment"],
+                )
+                levels_to_measure = [measured_levels[i] for i in outlying]
+
+        #changing notation to kappa for background to separate from red-and-green calibration
+        self._set_calibration_polynomial(calibration_type, polynomial)
 
         if save_results:
             calibration_data_path = self.participant.path / f"calibration_{calibration_type}"
@@ -119,33 +301,170 @@ class Experiment:
                             "Betas cannot exceed 1. Recalibration is required."
                         )
 
-            with open((calibration_data_path / f"calibration_{calibration_type}.json"), "w") as f:
-                json.dump(self.betas_calibration, f, indent=4)
+            with open((calibration_data_path / f"flicker_{calibration_type}.json"), "w") as f:
+                json.dump(flicker_logs, f, indent=4)
+
+            icontrasts = sorted(self.betas_calibration.keys())
+            calibration = Calibration(
+                calibration_type=calibration_type,
+                coefficients=[float(c) for c in polynomial.coefficients],
+                alphas=[
+                    gamma - self.params.calibration_params["alpha_decrement"] * icontrast
+                    for icontrast in icontrasts
+                ],
+                betas=[float(self.betas_calibration[icontrast]) for icontrast in icontrasts],
+                monitor=dict(self.params.monitor_identity),
+                refresh_rate=self.params.screen_params["refresh_rate__hz"],
+                gamma=gamma,
+                timestamp=datetime.now().isoformat(),
+            )
+            calibration.save(
+                Calibration.get_path(self.participant.path, calibration_type)
+            )
+
+    def _run_calibration_level(
+        self, calibration_type: str, icontrast: int, gamma: float
+    ) -> tuple[float, dict]:
+        alpha = (
+            gamma
+            - self.params.calibration_params["alpha_decrement"] * icontrast
+        )
+        beta_0 = self.params.calibration_params["beta_0"]
+        beta_0_jitter = 0.0
+        rng = None
+        if self._calibration_prior is not None:
+            prior_polynomial, _residual_sd = self._calibration_prior
+            beta_0 = float(prior_polynomial(alpha))
+            beta_0_jitter = self.params.calibration_params["prior_offset_range"]
+            # a child generator per level, as the render process gets a copy
+            rng = self._calibration_rng.spawn(1)[0]
+
+        return self.renderer.run_calibration_level(
+            calibration_type=calibration_type,
+            alpha=alpha,
+            beta_0=beta_0,
+            beta_0_jitter=beta_0_jitter,
+            rng=rng,
+        )
+
+    def _get_next_calibration_level(self, contrast_levels: list, gamma: float) -> int | None:
+        """
+        The unmeasured contrast level with the widest confidence band of the
+        quadratic fit, or None once the band is below the tolerance everywhere
+        """
+        alpha_decrement = self.params.calibration_params["alpha_decrement"]
+        measured_levels = sorted(self.betas_calibration.keys())
+        unmeasured_levels = [
+            icontrast for icontrast in contrast_levels if icontrast not in self.betas_calibration
+        ]
+        if len(unmeasured_levels) == 0:
+            return None
+
+        band = get_calibration_fit_band(
+            alphas=[gamma - alpha_decrement * icontrast for icontrast in measured_levels],
+            betas=[self.betas_calibration[icontrast] for icontrast in measured_levels],
+            alphas_grid=[gamma - alpha_decrement * icontrast for icontrast in unmeasured_levels],
+            min_sigma=self.params.calibration_params["beta_increment"],
+        )
+        if band.max() < self.params.calibration_params["adaptive_fit_tolerance"]:
+            return None
+        return unmeasured_levels[int(np.argmax(band))]
+
+    def _set_calibration_polynomial(self, calibration_type: str, polynomial):
+        if isinstance(polynomial, np.poly1d):
+            self._calibration_coefficients[calibration_type] = [
+                float(c) for c in polynomial.coefficients
+            ]
+        if calibration_type == "DCF_colors":
+            self.beta_polynomial = polynomial
+        if calibration_type == "background":
+            self.kappa_polynomial = polynomial
+        # colors for the whole 8-bit alpha grid, shared by all blocks
+        self.color_table = Color_Table(
+            gamma=self.params.visual_params["full_saturation_value"],
+            beta_polynomial=self.beta_polynomial,
+            kappa_polynomial=self.kappa_polynomial,
+        )
+        self.renderer.set_calibration(
+            beta_polynomial=self.beta_polynomial,
+            kappa_polynomial=self.kappa_polynomial,
+        )
+
+    def _load_valid_calibration(self, calibration_type: str) -> bool:
+        """
+        Loading the stored calibration of the participant if it was made
+        on the same monitor with the same refresh rate and gamma no longer
+        than max_age__days ago. Returns whether a calibration was loaded.
+        """
+        calibration_path = Calibration.get_path(self.participant.path, calibration_type)
+        if not calibration_path.exists():
+            return False
+
+        calibration = Calibration.load(calibration_path)
+        is_valid = calibration.is_valid_for(
+            monitor=self.params.monitor_identity,
+            refresh_rate=self.params.screen_params["refresh_rate__hz"],
+            gamma=self.params.visual_params["full_saturation_value"],
+            max_age__days=self.params.calibration_params["max_age__days"],
+        )
+        if not is_valid:
+            return False
 
-            with open(calibration_data_path / f"polynomial_{calibration_type}.pickle", "wb") as f:
-                pickle.dump(polynomial, f)
+        self._set_calibration_polynomial(calibration_type, calibration.polynomial)
+        session_log.info("calibration_reused", path=calibration_path)
+        return True
 
     def load_calibration(self):
-        # DCF calibration
-        calibration_data_path = self.participant.path / "calibration_DCF_colors"
-        with open(calibration_data_path / f"polynomial_DCF_colors.pickle", "rb") as f:
-            beta_polynomial = pickle.load(f)
-        print(f"Calibration loaded from {calibration_data_path}")
-        self.beta_polynomial = beta_polynomial
-
-        # Background calibration
-        calibration_data_path = self.participant.path / "calibration_background"
-        with open(calibration_data_path / f"polynomial_background.pickle", "rb") as f:
-            kappa_polynomial = pickle.load(f)
-        print(f"Calibration loaded from {calibration_data_path}")
-        self.kappa_polynomial = kappa_polynomial
-
-    def _set_background_color(self, alpha):
-        kappa = self.kappa_polynomial(alpha)
-        gamma = self.params.visual_params["full_saturation_value"]
-        background_color = colors.Color(kappa * np.array([gamma, gamma, gamma]), space="rgb1")
-        self.window.setColor(background_color)
+        """Loading the stored calibrations; pickled ones of earlier sessions are migrated once"""
+        for calibration_type in ["DCF_colors", "background"]:
+            calibration_path = Calibration.get_path(self.participant.path, calibration_type)
+            if not calibration_path.exists():
+                Calibration.migrate_legacy(
+                    participant_path=self.participant.path,
+                    calibration_type=calibration_type,
+                    gamma=self.params.visual_params["full_saturation_value"],
+                    alpha_decrement=self.params.calibration_params["alpha_decrement"],
+                )
+            calibration = Calibration.load(calibration_path)
+            self._set_calibration_polynomial(calibration_type, calibration.polynomial)
+            session_log.info("calibration_loaded", path=calibration_path)
+
+    def _get_block_plan(
+        self,
+        block_code: str,
+        alphas: list,
+        color_modes: list,
+        is_constant_stim: bool,
+        hidden_trial_ratio: float = 0.0,
+        is_two_interval: bool = False,
+    ) -> np.ndarray:
+        """Drawing the block plan from the session seed and saving it before the block"""
+        plan = make_block_plan(
+            rng=get_block_rng(self.session_seed, block_code),
+            alphas=alphas,
+            color_modes=color_modes,
+            stimulus_onset_limits=self.params.stimulus_onset_limits__frames,
+            stimulus_duration=self.params.exp_trial_params["stimulus_duration__frames"],
+            iti_duration_limits=self.params.iti_duration_limits__frames,
+            hidden_trial_ratio=hidden_trial_ratio,
+            is_constant_stim=is_constant_stim,
+            trial_duration=self.params.exp_trial_params["trial_duration__frames"],
+            is_two_interval=is_two_interval,
+        )
+        save_block_plan(plan, self.participant.path / block_code / "block_plan.npy")
+        return plan
+
+    def _run_planned_block(self, block_code: str, plan: np.ndarray, **block_spec):
+        """
+        Running the planned block (see block_runner.run_planned_block) and
+        saving its timeline log.
+        """
+        timeline_log = self.renderer.run_block(
+            block_code=block_code, data_folder=self.participant.path, plan=plan, **block_spec
+        )
+        save_timeline_log(timeline_log, self.participant.path / block_code / "timeline.json")
 
+    @_session_step()
     def run_experimental_block(
         self,
         block_code: str,
@@ -178,102 +497,25 @@ class Experiment:
         else:
             discrimination_info = None
 
-        # Setting stimulus duration
-        stimulus_duration = None
-        stimulus_onset = None
-        if is_constant_stim:
-            stimulus_duration = self.params.exp_trial_params["trial_duration__frames"]
-            stimulus_onset = 0
-        else:
-            stimulus_duration = self.params.exp_trial_params[
-                "stimulus_duration__frames"
-            ]
-            stimulus_onset = random.randint(
-                self.params.exp_trial_params["no_stimulus_interval_front__frames"],
-                self.params.exp_trial_params["trial_duration__frames"]
-                - self.params.exp_trial_params["no_stimulus_interval_back__frames"],
-            )
-
-        for itrial in range(n_trials):
-
-            self._set_background_color(alphas[itrial])
-            trial = DCM_Trial(
-                index=str(f"{block_code}_{itrial}"),
-                window=self.window,
-                data_folder=self.participant.path / block_code,
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                max_trial_duration=self.params.exp_trial_params[
-                    "trial_duration__frames"
-                ],
-                stimulus_source=self.params.stimuli_codes["gabor"],
-                stimulus_duration=stimulus_duration,
-                stimulus_onset=stimulus_onset,
-                detection_judgement_routine=detection_info,
-                discrimination_judgement_routine=discrimination_info,
-                termination_buttons=forced_termination_buttons,
-                color_mode=color_modes[itrial],
-                stimulus_orientation=random.choice(["left", "right"]), ##### DEBUGGING
-                gamma=self.params.visual_params["full_saturation_value"],
-                alpha=alphas[itrial],
-                beta_polynomial=self.beta_polynomial,
-            )
-
-            iti = Inter_Trial_Interval(
-                index=str(f"{block_code}_{itrial}"),
-                data_folder=self.participant.path / "inter_trial_intervals",
-                window=self.window,
-                duration=random.randint(
-                    self.params.exp_trial_params[
-                        "inter_trial_interval_lower_limit__frames"
-                    ],
-                    self.params.exp_trial_params[
-                        "inter_trial_interval_higher_limit__frames"
-                    ],
-                ),
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-            )
-
-            ###### block sequence #####
-            trial.process_stimuli()
-            random_number = random.random()
-
-            if random_number > hidden_trial_ratio:
-                trial.run()
-            else:
-                trial.run(hide_stimulus=True)
+        plan = self._get_block_plan(
+            block_code=block_code,
+            alphas=alphas,
+            color_modes=color_modes,
+            is_constant_stim=is_constant_stim,
+            hidden_trial_ratio=hidden_trial_ratio,
+        )
 
-            trial.collect_responses()
-            trial.save_data()
-            if is_iti_included:
-                iti.wait()
-                iti.save_data()
+        self._run_planned_block(
+            block_code=block_code,
+            plan=plan,
+            detection_info=detection_info,
+            discrimination_info=discrimination_info,
+            termination_buttons=forced_termination_buttons,
+            is_iti_included=is_iti_included,
+            is_background_adjusted=True,
+        )
 
+    @_session_step()
     def run_2I2AFC_block(
         self,
         block_code: str,
@@ -305,247 +547,54 @@ class Experiment:
         else:
             discrimination_info = None
 
-        # Setting stimulus duration
-        stimulus_duration = None
-        stimulus_onset = None
-        if is_constant_stim:
-            stimulus_duration = self.params.exp_trial_params["trial_duration__frames"]
-            stimulus_onset = 0
-        else:
-            stimulus_duration = self.params.exp_trial_params[
-                "stimulus_duration__frames"
-            ]
-            stimulus_onset = random.randint(
-                self.params.exp_trial_params["no_stimulus_interval_front__frames"],
-                self.params.exp_trial_params["trial_duration__frames"]
-                - self.params.exp_trial_params["no_stimulus_interval_back__frames"],
-            )
-
-        for itrial in range(n_trials):
-
-            trial = DCM_Trial(
-                index=str(f"{block_code}_{itrial}"),
-                window=self.window,
-                data_folder=self.participant.path / block_code,
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                max_trial_duration=self.params.exp_trial_params[
-                    "trial_duration__frames"
-                ],
-                stimulus_source=self.params.stimuli_codes["gabor"],
-                stimulus_duration=stimulus_duration,
-                stimulus_onset=stimulus_onset,
-                detection_judgement_routine=detection_info,
-                discrimination_judgement_routine=discrimination_info,
-                termination_buttons=forced_termination_buttons,
-                color_mode=color_modes[itrial],
-                stimulus_orientation=random.choice(["left", "right"]),
-                gamma=self.params.visual_params["full_saturation_value"],
-                alpha=alphas[itrial],
-                beta_polynomial=self.beta_polynomial,
-            )
-
-            iti = Inter_Trial_Interval(
-                index=str(f"{block_code}_{itrial}"),
-                data_folder=self.participant.path / "inter_trial_intervals",
-                window=self.window,
-                duration=random.randint(
-                    self.params.exp_trial_params[
-                        "inter_trial_interval_lower_limit__frames"
-                    ],
-                    self.params.exp_trial_params[
-                        "inter_trial_interval_higher_limit__frames"
-                    ],
-                ),
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-            )
-
-            iii = Inter_Trial_Interval(
-                index=str(f"{block_code}_{itrial}"),
-                data_folder=self.participant.path / "inter_trial_intervals",
-                window=self.window,
-                duration=60,
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-            )
+        plan = self._get_block_plan(
+            block_code=block_code,
+            alphas=alphas,
+            color_modes=color_modes,
+            is_constant_stim=is_constant_stim,
+            is_two_interval=True,
+        )
 
-            ###### block sequence #####
-            configuration_2IFC = random.choice([1, 2])
-            trial.process_stimuli()
-            if configuration_2IFC == 1:
-                trial.index = str(trial.index)  + "_stim"
-                trial.run()
-                trial.save_data() 
-                iii.wait()
-                trial.index = str(trial.index) + "_empty"
-                trial.run(hide_stimulus=True)
-                trial.save_data()
-                trial.collect_interval_response(interval_probe_params=self.params.interval_probe_params)
-                trial.collect_responses()
-                trial.save_data()
-                if is_iti_included:
-                    iti.wait()
-                    iti.save_data()
-            elif configuration_2IFC == 2:
-                trial.index = str(trial.index)  + "_empty"
-                trial.run(hide_stimulus=True)
-                trial.save_data() 
-                trial.index = str(trial.index) + "_stim"
-                iii.wait()
-                trial.run()
-                trial.save_data()
-                trial.collect_interval_response(interval_probe_params=self.params.interval_probe_params)
-                trial.collect_responses()
-                trial.save_data()
-                if is_iti_included:
-                    iti.wait()
-                    iti.save_data()
-            
+        self._run_planned_block(
+            block_code=block_code,
+            plan=plan,
+            detection_info=detection_info,
+            discrimination_info=discrimination_info,
+            termination_buttons=forced_termination_buttons,
+            is_iti_included=is_iti_included,
+            is_background_adjusted=False,
+        )
 
+    @_session_step()
     def run_stereo_adaptation_block(self, block_code, n_trials_max):
         progress_tracker = []
         for itrial in range(n_trials_max):
             stimulus_direction = random.choice(["left", "right", "up", "down"])
-            stimuli = [
-                self.params.stimuli_codes[f"E_{stimulus_direction}_{side}"]
-                for side in ["left", "right"]
-            ]
-            trial = Stereo_Trial(
+            info = self.renderer.run_stereo_trial(
                 index=str(f"{block_code}_{itrial}"),
-                stimulus_index=stimulus_direction,
-                window=self.window,
                 data_folder=self.participant.path / block_code,
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                max_trial_duration=self.params.exp_trial_params[
-                    "trial_duration__frames"
-                ],
-                stimulus_source=stimuli,
-                termination_buttons=["left", "right", "up", "down"],
+                stimulus_direction=stimulus_direction,
             )
-
-            ###### block sequence #####
-            trial.process_stimuli()
-            trial.run()
-            if trial.info["direction"] == trial.info["terminated_by"]:
+            if info["direction"] == info["terminated_by"]:
                 progress_tracker.append(True)
             else:
                 progress_tracker.append(False)
-            trial.save_data()
 
             if len(progress_tracker) > 3:
                 if all(progress_tracker[-3:]):
                     break
 
+    @_session_step(is_block=False)
     def display_text(self, text: str, text_mode: str, termination_buttons: list):
-        if text_mode not in ["fusion", "default"]:
-            raise ValueError("text mode can be either fusion or default")
-
-        stimuli = []
-        if text_mode == "default":
-            text_stim = visual.TextBox2(
-                units="pix",
-                win=self.window,
-                alignment="center",
-                text=text,
-                size=[
-                    self.params.screen_params["resolution_x__px"],
-                    self.params.screen_params["resolution_y__px"],
-                ],
-                letterHeight=int(
-                    0.2
-                    * self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                pos=(0, 0),
-                color=self.params.frame_color,
-            )
-            stimuli.append(text_stim)
-        elif text_mode == "fusion":
-            text_builder = Dichoptic_Text(
-                window=self.window,
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                termination_buttons=termination_buttons,
-            )
-            text_builder.process_stimuli(text=text)
-            stimuli = text_builder.stimuli + text_builder.dichoptic_canvas
-
-        while True:
-            for stim in stimuli:
-                stim.draw()
-            self.window.flip()
-            keys_pressed = event.getKeys()
-            if any([button in keys_pressed for button in termination_buttons]):
-                break
+        self.renderer.display_text(
+            text=text, text_mode=text_mode, termination_buttons=termination_buttons
+        )
 
+    @_session_step()
     def run_slider_based_adjustment_block(
         self,
         block_code: str,
     ) -> float:
-
-        gamma = self.params.visual_params["full_saturation_value"]
         alpha = (
             self.params.visual_params["full_saturation_value"]
             - 0.2 * self.params.visual_params["full_saturation_value"]
@@ -554,167 +603,39 @@ class Experiment:
         trial_index = -1
         while True:
             trial_index += 1
-            trial = DCM_Trial(
+            alpha, is_block_finished = self.renderer.run_slider_trial(
                 index=str(f"{block_code}_{trial_index}"),
-                window=self.window,
                 data_folder=self.participant.path / block_code,
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                max_trial_duration=self.params.exp_trial_params[
-                    "trial_duration__frames"
-                ],
-                stimulus_source=self.params.stimuli_codes["gabor"],
-                stimulus_duration=self.params.exp_trial_params[
-                    "stimulus_duration__frames"
-                ],
-                stimulus_onset=random.randint(
-                    self.params.exp_trial_params["no_stimulus_interval_front__frames"],
-                    self.params.exp_trial_params["trial_duration__frames"]
-                    - self.params.exp_trial_params["no_stimulus_interval_back__frames"],
-                ),
-                detection_judgement_routine=self.params.detection_report_params,
-                discrimination_judgement_routine=None,
-                termination_buttons=None,
-                color_mode="fusion",
-                stimulus_orientation=random.choice(["left", "right"]),
-                gamma=gamma,
                 alpha=alpha,
-                beta_polynomial=self.beta_polynomial,
-            )
-
-            iti = Inter_Trial_Interval(
-                index=str(f"{block_code}_{trial_index}"),
-                data_folder=self.participant.path
-                / f"{block_code}_inter_trial_intervals",
-                window=self.window,
-                duration=random.randint(
-                    self.params.exp_trial_params[
-                        "inter_trial_interval_lower_limit__frames"
-                    ],
-                    self.params.exp_trial_params[
-                        "inter_trial_interval_higher_limit__frames"
-                    ],
-                ),
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-            )
-
-            slider_menu = Dichoptic_Slider(
-                window=self.window,
-                scale=[int(0.625 * 100 * gamma), int(100 * gamma)],
-                current_value=alpha * 100,
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                termination_buttons=["space"],
-                block_finish_buttons=["q"],
-                increase_buttons=["o"],
-                decrease_buttons=["m"],
+                stimulus_orientation=random.choice(["left", "right"]),
+                iti_data_folder=self.participant.path / f"{block_code}_inter_trial_intervals",
             )
-
-            ###### block sequence #####
-            trial.process_stimuli()
-            slider_menu.process_stimuli()
-
-            trial.run()
-            trial.collect_responses()
-
-            alpha = slider_menu.run() / 100
-
-            info = slider_menu.get_data()
-            trial.save_data()
-
-            if info["block_finish_called"] == "yes":
+            if is_block_finished:
                 break
-            iti.wait()
 
-        return alpha
+        return self.color_table.get_alpha(alpha)
 
+    @_session_step()
     def run_adjustment_block(self, block_code: str, adjustment_buttons: list) -> float:
-
         random.seed(random.randint(1, 99999))
-        gamma = self.params.visual_params["full_saturation_value"]
         alpha = (
             self.params.visual_params["full_saturation_value"]
             - 0.2 * self.params.visual_params["full_saturation_value"]
         )
 
-        adj_trial = Adjustment_DCM_Trial(
+        ###### block sequence #####
+        alpha = self.renderer.run_adjustment(
             index=str(f"{block_code}_results"),
-            window=self.window,
             data_folder=self.participant.path / block_code,
-            square_size=int(
-                self.params.visual_params["square_size__degrees"]
-                * self.params.px_per_deg
-            ),
-            inter_square_distance=int(
-                self.params.visual_params["inter_square_distance__degrees"]
-                * self.params.px_per_deg
-            ),
-            frame_color=self.params.frame_color,
-            frame_thickness=self.params.visual_params["frame_thickness__percent"],
-            fixation_cross_size=int(
-                self.params.visual_params["fixation_cross_size__degrees"]
-                * self.params.px_per_deg
-            ),
-            max_trial_duration=99999,
-            stimulus_source=self.params.stimuli_codes["gabor"],
-            stimulus_duration=99999,
-            stimulus_onset=0,
-            detection_judgement_routine=None,
-            discrimination_judgement_routine=None,
-            termination_buttons=["space"],
-            color_mode="fusion",
-            stimulus_orientation=random.choice(["left", "right"]), #DEBUGGING
-            gamma=gamma,
             alpha=alpha,
-            beta_polynomial=self.beta_polynomial,
-        )
-
-        ###### block sequence #####
-        adj_trial.process_stimuli()
-        alpha = adj_trial.run(
-            adjustment_buttons=adjustment_buttons, adjustment_value=0.002, kappa_polynomial=self.kappa_polynomial
+            stimulus_orientation=random.choice(["left", "right"]),
+            adjustment_buttons=adjustment_buttons,
         )
 
         random.seed(None)
         return alpha
 
+    @_session_step()
     def run_adapted_staircase(
         self,
         block_code: str,
@@ -723,140 +644,102 @@ class Experiment:
         alpha_increment: float,
         exploration_range: float,
     ) -> float:
-        STAIRCASES = ["Swiss", "Dutch"]
         gamma = self.params.visual_params["full_saturation_value"]
 
-        staircase_history = {staircase: [] for staircase in STAIRCASES}
-        staircase_history["Swiss"].append(suggested_alpha + exploration_range / 2)
-        staircase_history["Dutch"].append(suggested_alpha - exploration_range / 2)
+        staircases = Interleaved_Staircase(
+            staircases=[
+                Staircase(
+                    name=name,
+                    start_value=start_value,
+                    increment=alpha_increment,
+                    decrement=alpha_increment,
+                    n_reversals=n_reversals,
+                    min_value=0,
+                    max_value=gamma,
+                )
+                for name, start_value in [
+                    ("Swiss", self.color_table.get_alpha(suggested_alpha + exploration_range / 2)),
+                    ("Dutch", self.color_table.get_alpha(suggested_alpha - exploration_range / 2)),
+                ]
+            ],
+            state_file=self.participant.path / block_code / "staircase_state.json",
+        )
+
+        self.renderer.start_prefetching(alphas=staircases.get_values())
 
         trial_index = -1
         while True:
             trial_index += 1
-            staircase = random.choice(STAIRCASES)
-            current_alpha = staircase_history[staircase][-1]
-            trial = DCM_Trial(
+            staircase = staircases.choose()
+            current_alpha = self.color_table.get_alpha(staircases[staircase].value)
+
+            ###### block sequence #####
+            info = self.renderer.run_dcm_trial(
                 index=str(f"{block_code}_{trial_index}"),
-                window=self.window,
                 data_folder=self.participant.path / block_code,
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                max_trial_duration=self.params.exp_trial_params[
-                    "trial_duration__frames"
-                ],
-                stimulus_source=self.params.stimuli_codes["gabor"],
-                stimulus_duration=self.params.exp_trial_params[
-                    "stimulus_duration__frames"
-                ],
-                stimulus_onset=random.randint(
-                    self.params.exp_trial_params["no_stimulus_interval_front__frames"],
-                    self.params.exp_trial_params["trial_duration__frames"]
-                    - self.params.exp_trial_params["no_stimulus_interval_back__frames"],
-                ),
-                detection_judgement_routine=self.params.detection_report_params,
-                discrimination_judgement_routine=None,
-                termination_buttons=None,
-                color_mode="fusion",
-                stimulus_orientation=random.choice(["left", "right"]),
-                gamma=gamma,
                 alpha=current_alpha,
-                beta_polynomial=self.beta_polynomial,
-            )
-
-            iti = Inter_Trial_Interval(
-                index=str(f"{block_code}_{trial_index}"),
-                data_folder=self.participant.path
+                stimulus_orientation=random.choice(["left", "right"]),
+                iti_data_folder=self.participant.path
                 / f"{block_code}_inter_trial_intervals",
-                window=self.window,
-                duration=random.randint(
-                    self.params.exp_trial_params[
-                        "inter_trial_interval_lower_limit__frames"
-                    ],
-                    self.params.exp_trial_params[
-                        "inter_trial_interval_higher_limit__frames"
-                    ],
-                ),
-                square_size=int(
-                    self.params.visual_params["square_size__degrees"]
-                    * self.params.px_per_deg
-                ),
-                inter_square_distance=int(
-                    self.params.visual_params["inter_square_distance__degrees"]
-                    * self.params.px_per_deg
-                ),
-                frame_color=self.params.frame_color,
-                frame_thickness=self.params.visual_params["frame_thickness__percent"],
-                fixation_cross_size=int(
-                    self.params.visual_params["fixation_cross_size__degrees"]
-                    * self.params.px_per_deg
-                ),
+                prefetch_alphas=staircases.get_next_values(staircase),
             )
-
-            ###### block sequence #####
-            trial.process_stimuli()
-            trial.run()
-            trial.collect_responses()
-            trial.save_data()
-            info = trial.get_data()
-            if info["detection_response"] == "yes":
-                alpha_updated = current_alpha + alpha_increment
-            elif info["detection_response"] == "no":
-                alpha_updated = current_alpha - alpha_increment
-
-            if alpha_updated > trial.gamma:
-                alpha_updated = trial.gamma 
-            if alpha_updated < 0:
-                alpha_updated = 0
-
-            print(staircase, alpha_updated)
-
-            staircase_history[staircase].append(alpha_updated)
-            iti.wait()
-
-            converged_alpha = _get_staircase_covnergence(
-                staircase_history=staircase_history, n_reversals=n_reversals
+            alpha_updated = staircases.update(
+                name=staircase, response=info["detection_response"] == "yes"
             )
-            if converged_alpha is not None:
-                break
 
-        return converged_alpha
+            session_log.info("staircase_update", staircase=staircase, alpha=alpha_updated)
 
+            if staircases.is_converged:
+                break
 
-def _get_staircase_covnergence(staircase_history: dict, n_reversals: int):
-    staircase_convergence = None
-    keys = [key for key in staircase_history.keys()]
-    individual_convergences = {staircase_name: None for staircase_name in keys}
+        self.renderer.stop_prefetching()
+        # the threshold is used as a displayed alpha, so it is kept on the 8-bit grid
+        self.staircase_threshold = self.color_table.get_alpha(staircases.convergence)
+        return self.staircase_threshold
 
-    for staircase_name in keys:
-        staircase = staircase_history[staircase_name]
-        if len(staircase) > n_reversals:
-            reversals_found = _get_number_of_reversals(staircase)
-            if reversals_found >= n_reversals:
-                individual_convergences[staircase_name] = np.mean(staircase[-5:])
 
-    if all([result is not None for result in individual_convergences.values()]):
-        staircase_convergence = np.mean(
-            [[result for result in individual_convergences.values()]]
+    @_session_step()
+    def run_quest_staircase(
+        self,
+        block_code: str,
+        threshold_width: float = 2 / 255,
+        max_trials: int = 80,
+    ) -> float:
+        """
+        Alternative to run_adapted_staircase: QUEST+ estimation of the
+        detection threshold, terminating once the posterior SD of the
+        threshold falls below threshold_width (or after max_trials).
+        """
+        gamma = self.params.visual_params["full_saturation_value"]
+        quest = Quest_Plus(
+            gamma=gamma, threshold_width=threshold_width, max_trials=max_trials
         )
-    return staircase_convergence
 
+        trial_index = -1
+        while not quest.is_finished:
+            trial_index += 1
+            current_alpha = quest.next_alpha()
+
+            ###### block sequence #####
+            info = self.renderer.run_dcm_trial(
+                index=str(f"{block_code}_{trial_index}"),
+                data_folder=self.participant.path / block_code,
+                alpha=current_alpha,
+                stimulus_orientation=random.choice(["left", "right"]),
+                iti_data_folder=self.participant.path
+                / f"{block_code}_inter_trial_intervals",
+            )
+            quest.update(
+                alpha=current_alpha, response=info["detection_response"] == "yes"
+            )
+
+            session_log.info(
+                "quest_update",
+                alpha=current_alpha,
+                threshold_estimate=quest.threshold_estimate,
+            )
 
-def _get_number_of_reversals(staircase: list) -> int:
-    n = len(staircase)
-    counter = 0
-    for i in range(n - 2):
-        if staircase[i] == staircase[i + 2]:
-            counter += 1
-    return counter
+        quest.save_summary(self.participant.path / block_code / "quest_summary.json")
+        # the threshold is used as a displayed alpha, so it is kept on the 8-bit grid
+        self.staircase_threshold = self.color_table.get_alpha(quest.threshold_estimate)
+        return self.staircase_threshold
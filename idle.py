@@ -0,0 +1,125 @@
+from pathlib import Path
+import json
+import time
+
+from psychopy import visual
+
+IDLE_LOG = []  # one report per waiting screen, see Idle_Screen.wait
+
+
+class Idle_Screen:
+    """
+    Low-CPU waiting for input on a static screen (instructions, reports,
+    slider, calibration plot).
+
+    The screen is drawn and flipped once; afterwards it is redrawn only
+    when `get_state()` changes or every `redraw_interval` seconds. Between
+    checks the process sleeps until an input event arrives (pyglet event
+    loop) or `poll_interval` elapses, instead of flipping at the refresh
+    rate. With `redraw_interval=None` the screen is redrawn on every frame
+    as before, which allows comparing the CPU usage of both modes.
+    """
+
+    def __init__(
+        self,
+        window: visual.Window,
+        name: str,
+        redraw_interval: float | None = 0.5,
+        poll_interval: float = 0.01,
+    ):
+        self.window = window
+        self.name = name
+        self.redraw_interval = redraw_interval
+        self.poll_interval = poll_interval
+        self.report = None
+        self._event_loop = None
+        if getattr(window, "winType", None) == "pyglet":
+            try:
+                import pyglet
+
+                self._event_loop = pyglet.app.platform_event_loop
+            except (ImportError, AttributeError):
+                self._event_loop = None
+
+    def _sleep(self):
+        if self._event_loop is None:
+            time.sleep(self.poll_interval)
+            return
+        # returns as soon as the OS has an event for the window
+        self._event_loop.step(self.poll_interval)
+        self.window.winHandle.dispatch_events()
+
+    def wait(self, draw_list: list, poll, get_state=None):
+        """
+        draw_list: objects drawn on every redraw
+        poll: called after every wake-up; the wait ends with its first
+            result other than None, which is returned
+        get_state: the screen is redrawn whenever its value changes
+        """
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        n_redraws = 0
+        n_polls = 0
+
+        state = None
+        last_draw = None
+        result = None
+        while result is None:
+            is_changed = get_state is not None and get_state() != state
+            is_due = (
+                last_draw is None
+                or self.redraw_interval is None
+                or time.perf_counter() - last_draw >= self.redraw_interval
+            )
+            if is_changed or is_due:
+                if get_state is not None:
+                    state = get_state()
+                for visual_object in draw_list:
+                    visual_object.draw()
+                self.window.flip()
+                last_draw = time.perf_counter()
+                n_redraws += 1
+            elif self.redraw_interval is not None:
+                self._sleep()
+
+            result = poll()
+            n_polls += 1
+
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+        self.report = {
+            "screen": self.name,
+            "is_idle": self.redraw_interval is not None,
+            "wall_time__s": wall_time,
+            "cpu_time__s": cpu_time,
+            "cpu_fraction": cpu_time / wall_time if wall_time > 0 else None,
+            "n_redraws": n_redraws,
+            "n_polls": n_polls,
+        }
+        IDLE_LOG.append(self.report)
+        return result
+
+
+def get_idle_summary(log: list | None = None) -> dict:
+    """CPU usage over all logged waiting screens, per mode (idle or full-rate)"""
+    log = IDLE_LOG if log is None else log
+    summary = {}
+    for is_idle, mode in [(True, "idle"), (False, "full_rate")]:
+        reports = [report for report in log if report["is_idle"] == is_idle]
+        wall_time = sum(report["wall_time__s"] for report in reports)
+        cpu_time = sum(report["cpu_time__s"] for report in reports)
+        summary[mode] = {
+            "n_screens": len(reports),
+            "wall_time__s": wall_time,
+            "cpu_time__s": cpu_time,
+            "cpu_fraction": cpu_time / wall_time if wall_time > 0 else None,
+            "n_redraws": sum(report["n_redraws"] for report in reports),
+        }
+    return summary
+
+
+def save_idle_log(path: Path, log: list | None = None):
+    log = IDLE_LOG if log is None else log
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"summary": get_idle_summary(log), "screens": log}, f, indent=4)
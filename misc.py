@@ -1,18 +1,21 @@
-import copy
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
+from datetime import datetime
 from pathlib import Path
+import platform
+import time
 import math
 import json
+import pickle
 
-import matplotlib
 import pandas as pd
-import matplotlib.pyplot as plt
 import tkinter as tk
 from tkinter import messagebox
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from psychopy import visual, event, colors
 import numpy as np
 
+from idle import Idle_Screen
+from session_log import session_log
+
 
 @dataclass
 class Participant:
@@ -45,7 +48,301 @@ class Participant:
             json.dump(demographics, f, indent=4)
 
 
+@dataclass
+class Calibration:
+    """
+    Result of a color contrast calibration with the metadata needed to
+    decide whether it can be reused: the monitor identity, refresh rate,
+    full saturation value (gamma) and the time of the calibration.
+    Stored as a single JSON file (no pickle).
+    """
+
+    calibration_type: str
+    coefficients: list
+    alphas: list
+    betas: list
+    monitor: dict
+    refresh_rate: int
+    gamma: float
+    timestamp: str
+
+    @property
+    def polynomial(self) -> np.poly1d:
+        return np.poly1d(self.coefficients)
+
+    @staticmethod
+    def get_path(participant_path: Path, calibration_type: str) -> Path:
+        return (
+            participant_path
+            / f"calibration_{calibration_type}"
+            / f"calibration_{calibration_type}_store.json"
+        )
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=4)
+
+    @classmethod
+    def load(cls, path: Path):
+        with open(path, "r") as f:
+            return cls(**json.load(f))
+
+    @classmethod
+    def migrate_legacy(
+        cls,
+        participant_path: Path,
+        calibration_type: str,
+        gamma: float,
+        alpha_decrement: float,
+    ):
+        """
+        Converting a calibration saved by the earlier code (pickled
+        polynomial_<type>.pickle and betas in calibration_<type>.json) into
+        the store; returns None if there is none. The monitor and refresh
+        rate of such calibrations are unknown (empty and 0), so they are
+        never reused for a new session or included in a population prior.
+        """
+        calibration_folder = participant_path / f"calibration_{calibration_type}"
+        polynomial_path = calibration_folder / f"polynomial_{calibration_type}.pickle"
+        if not polynomial_path.exists():
+            return None
+        with open(polynomial_path, "rb") as f:
+            polynomial = pickle.load(f)
+
+        betas = {}
+        betas_path = calibration_folder / f"calibration_{calibration_type}.json"
+        if betas_path.exists():
+            with open(betas_path, "r") as f:
+                betas = {int(icontrast): beta for icontrast, beta in json.load(f).items()}
+        icontrasts = sorted(betas.keys())
+
+        calibration = cls(
+            calibration_type=calibration_type,
+            coefficients=[float(c) for c in np.poly1d(polynomial).coefficients],
+            alphas=[gamma - alpha_decrement * icontrast for icontrast in icontrasts],
+            betas=[float(betas[icontrast]) for icontrast in icontrasts],
+            monitor={},
+            refresh_rate=0,
+            gamma=gamma,
+            timestamp=datetime.fromtimestamp(polynomial_path.stat().st_mtime).isoformat(),
+        )
+        calibration.save(cls.get_path(participant_path, calibration_type))
+        session_log.warning(
+            "legacy_calibration_migrated",
+            path=polynomial_path,
+            store=cls.get_path(participant_path, calibration_type),
+        )
+        return calibration
+
+    def is_valid_for(
+        self, monitor: dict, refresh_rate: int, gamma: float, max_age__days: float
+    ) -> bool:
+        age = datetime.now() - datetime.fromisoformat(self.timestamp)
+        return (
+            (self.monitor == monitor)
+            and (self.refresh_rate == refresh_rate)
+            and math.isclose(self.gamma, gamma)
+            and (age.total_seconds() <= max_age__days * 24 * 3600)
+        )
+
+
+class Frozen_Dict(dict):
+    """
+    Read-only dict for parameter sections. Stays a dict for JSON
+    serialization and indexing; copying returns the same object.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Parameters are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (Frozen_Dict, (dict(self),))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return Frozen_Dict({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_positive(value) -> bool:
+    return _is_number(value) and value > 0
+
+
+def _is_non_negative_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _is_fraction(value) -> bool:
+    return _is_number(value) and 0 <= value <= 1
+
+
+def _is_rgb1(value) -> bool:
+    return (
+        isinstance(value, list)
+        and len(value) == 3
+        and all(_is_fraction(channel) for channel in value)
+    )
+
+
+def _is_string_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def _is_flag(value) -> bool:
+    return value in (0, 1)
+
+
+_RESPONSE_SCHEMA = {
+    "question_icon_text": (str, "a string"),
+    "response_buttons": (_is_string_list, "a list of key names"),
+    "response_labels": (_is_string_list, "a list of labels"),
+    "is_mapping_to_shuffle__boolean": (_is_flag, "0 or 1"),
+}
+
+# section -> {key: (check, description)}; keys starting with "_" are comments
+PARAMETERS_SCHEMA = {
+    "screen_params": {
+        "distance_to_screen__cm": (_is_positive, "a positive number"),
+        "resolution_x__px": (_is_positive, "a positive number"),
+        "resolution_y__px": (_is_positive, "a positive number"),
+        "screen_width__cm": (_is_positive, "a positive number"),
+        "screen_height__cm": (_is_positive, "a positive number"),
+        "refresh_rate__hz": (_is_positive, "a positive number"),
+    },
+    "visual_params": {
+        "inter_square_distance__degrees": (_is_positive, "a positive number"),
+        "square_size__degrees": (_is_positive, "a positive number"),
+        "frame_thickness__percent": (_is_number, "a number"),
+        "fixation_cross_size__degrees": (_is_positive, "a positive number"),
+        "background_0_rgb1": (_is_rgb1, "three values in [0, 1]"),
+        "frame_rgb1": (_is_rgb1, "three values in [0, 1]"),
+        "full_saturation_value": (_is_fraction, "a value in [0, 1]"),
+    },
+    "exp_trial_params": {
+        "trial_duration__frames": (_is_non_negative_int, "a non-negative integer"),
+        "stimulus_duration__frames": (_is_non_negative_int, "a non-negative integer"),
+        "no_stimulus_interval_front__frames": (
+            _is_non_negative_int,
+            "a non-negative integer",
+        ),
+        "no_stimulus_interval_back__frames": (
+            _is_non_negative_int,
+            "a non-negative integer",
+        ),
+        "inter_trial_interval_lower_limit__frames": (
+            _is_non_negative_int,
+            "a non-negative integer",
+        ),
+        "inter_trial_interval_higher_limit__frames": (
+            _is_non_negative_int,
+            "a non-negative integer",
+        ),
+        "inter_interval_duration__frames": (
+            _is_non_negative_int,
+            "a non-negative integer",
+        ),
+    },
+    "calibration_params": {
+        "beta_0": (_is_number, "a number"),
+        "beta_increment": (_is_positive, "a positive number"),
+        "alpha_decrement": (_is_positive, "a positive number"),
+        "inter_round_waiting__s": (_is_number, "a number"),
+        "calibration_type": (str, "a string"),
+        "flicker_frequency__hz": (_is_positive, "a positive number"),
+        "max_age__days": (_is_positive, "a positive number"),
+        "adaptive_initial_levels": (_is_non_negative_int, "a non-negative integer"),
+        "adaptive_fit_tolerance": (_is_positive, "a positive number"),
+        "prior_offset_range": (_is_number, "a number"),
+    },
+    "contrast_practise_params": {
+        "contrast_levels": (
+            lambda value: isinstance(value, list) and all(map(_is_number, value)),
+            "a list of numbers",
+        ),
+        "trials_per_level": (_is_non_negative_int, "a non-negative integer"),
+        "max_trial_duration__frames": (_is_non_negative_int, "a non-negative integer"),
+    },
+    "detection_report_params": _RESPONSE_SCHEMA,
+    "discrimination_report_params": _RESPONSE_SCHEMA,
+    "interval_probe_params": _RESPONSE_SCHEMA,
+    "stimuli_codes": {
+        "gabor": (str, "a path"),
+    },
+}
+
+# sections whose other keys are free-form (e.g. additional stimuli)
+_OPEN_SECTIONS = {"stimuli_codes"}
+
+
+def _validate_section(section: str, values, source: str):
+    if not isinstance(values, dict):
+        raise ValueError(f"{source}: expected a JSON object for {section}")
+
+    schema = PARAMETERS_SCHEMA[section]
+    errors = []
+    for key, (check, description) in schema.items():
+        if key not in values:
+            errors.append(f"missing '{key}'")
+            continue
+        is_valid = (
+            isinstance(values[key], check) if isinstance(check, type) else check(values[key])
+        )
+        if not is_valid:
+            errors.append(f"'{key}' should be {description}, got {values[key]!r}")
+
+    if section not in _OPEN_SECTIONS:
+        for key in values:
+            if key not in schema and not key.startswith("_"):
+                errors.append(f"unknown key '{key}'")
+
+    if len(errors) > 0:
+        raise ValueError(f"{source} ({section}): " + "; ".join(errors))
+
+
 class Parameters:
+    """
+    Immutable configuration of the session, validated against
+    PARAMETERS_SCHEMA when loaded. The sections keep their JSON layout
+    (e.g. `params.visual_params["square_size__degrees"]`); pixel sizes,
+    the frame duration and the colors are derived once at construction.
+    Only the raw sections are pickled, so the object is cheap to send to
+    worker processes.
+    """
+
+    __slots__ = tuple(PARAMETERS_SCHEMA.keys()) + (
+        "px_per_deg",
+        "square_size__px",
+        "inter_square_distance__px",
+        "fixation_cross_size__px",
+        "frame_duration__s",
+        "stimulus_onset_limits__frames",
+        "iti_duration_limits__frames",
+        "background_0_rgb1",
+        "frame_rgb1",
+        "background_color_0",
+        "frame_color",
+        "monitor_identity",
+    )
+
     def __init__(
         self,
         screen_params_file: Path,
@@ -59,64 +356,262 @@ class Parameters:
         stimuli_codes_file: Path,
     ):
         params_folder = Path("params")
+        files = {
+            "screen_params": screen_params_file,
+            "visual_params": visual_params_file,
+            "exp_trial_params": exp_trial_params_file,
+            "calibration_params": calibration_params_file,
+            "contrast_practise_params": contrast_practise_params_file,
+            "detection_report_params": detection_report_params_file,
+            "discrimination_report_params": discrimination_report_params_file,
+            "interval_probe_params": interval_probe_prarms_file,
+            "stimuli_codes": stimuli_codes_file,
+        }
+        sections = {}
+        for section, file_name in files.items():
+            with open(params_folder / file_name, "rb") as file:
+                sections[section] = json.load(file)
+            _validate_section(section, sections[section], source=str(file_name))
+        self._set_sections(sections)
+
+    @classmethod
+    def from_file(cls, params_file: Path):
+        """Loading all sections from one consolidated JSON file"""
+        with open(params_file, "rb") as file:
+            sections = json.load(file)
+        missing = [section for section in PARAMETERS_SCHEMA if section not in sections]
+        if len(missing) > 0:
+            raise ValueError(f"{params_file}: missing sections {missing}")
+        for section in PARAMETERS_SCHEMA:
+            _validate_section(section, sections[section], source=str(params_file))
+        return cls._from_sections(sections)
+
+    @classmethod
+    def _from_sections(cls, sections: dict):
+        params = cls.__new__(cls)
+        params._set_sections(sections)
+        return params
+
+    def _set_sections(self, sections: dict):
+        set_attribute = super().__setattr__
+        for section in PARAMETERS_SCHEMA:
+            set_attribute(section, _freeze(sections[section]))
+
+        screen_params = self.screen_params
+        cm_per_degree = screen_params["distance_to_screen__cm"] * math.tan(
+            math.radians(1)
+        )
+        y_px_per_cm = screen_params["resolution_y__px"] / screen_params["screen_height__cm"]
+        x_px_per_cm = screen_params["resolution_x__px"] / screen_params["screen_width__cm"]
+        px_per_deg = (y_px_per_cm + x_px_per_cm) / 2 * cm_per_degree
+        set_attribute("px_per_deg", px_per_deg)
+
+        visual_params = self.visual_params
+        for size in ["square_size", "inter_square_distance", "fixation_cross_size"]:
+            set_attribute(
+                f"{size}__px", int(visual_params[f"{size}__degrees"] * px_per_deg)
+            )
+        set_attribute("frame_duration__s", 1 / screen_params["refresh_rate__hz"])
+        exp_trial_params = self.exp_trial_params
+        set_attribute(
+            "stimulus_onset_limits__frames",
+            (
+                exp_trial_params["no_stimulus_interval_front__frames"],
+                exp_trial_params["trial_duration__frames"]
+                - exp_trial_params["no_stimulus_interval_back__frames"],
+            ),
+        )
+        set_attribute(
+            "iti_duration_limits__frames",
+            (
+                exp_trial_params["inter_trial_interval_lower_limit__frames"],
+                exp_trial_params["inter_trial_interval_higher_limit__frames"],
+            ),
+        )
 
-        with open(params_folder / screen_params_file, "rb") as file:
-            self.screen_params = json.load(file)
+        for name in ["background_0_rgb1", "frame_rgb1"]:
+            rgb1 = np.array(visual_params[name], dtype=float)
+            rgb1.flags.writeable = False
+            set_attribute(name, rgb1)
+        set_attribute(
+            "background_color_0", colors.Color(self.background_0_rgb1, space="rgb1")
+        )
+        set_attribute("frame_color", colors.Color(self.frame_rgb1, space="rgb1"))
+
+        # computer and screen geometry a calibration is tied to
+        set_attribute(
+            "monitor_identity",
+            Frozen_Dict(
+                {
+                    "host": platform.node(),
+                    "resolution_x__px": screen_params["resolution_x__px"],
+                    "resolution_y__px": screen_params["resolution_y__px"],
+                    "screen_width__cm": screen_params["screen_width__cm"],
+                    "screen_height__cm": screen_params["screen_height__cm"],
+                }
+            ),
+        )
 
-        with open(params_folder / visual_params_file, "rb") as file:
-            self.visual_params = json.load(file)
+    def __setattr__(self, name, value):
+        raise AttributeError("Parameters are read-only")
 
-        with open(params_folder / exp_trial_params_file, "rb") as file:
-            self.exp_trial_params = json.load(file)
+    def __delattr__(self, name):
+        raise AttributeError("Parameters are read-only")
 
-        with open(params_folder / calibration_params_file, "rb") as file:
-            self.calibration_params = json.load(file)
+    def __reduce__(self):
+        return (
+            Parameters._from_sections,
+            ({section: getattr(self, section) for section in PARAMETERS_SCHEMA},),
+        )
 
-        with open(params_folder / contrast_practise_params_file, "rb") as file:
-            self.contrast_practise_params = json.load(file)
+    def to_dict(self) -> dict:
+        """All sections as one dict, the layout read by `from_file`"""
+        return {section: getattr(self, section) for section in PARAMETERS_SCHEMA}
 
-        with open(params_folder / detection_report_params_file, "rb") as file:
-            self.detection_report_params = json.load(file)
 
-        with open(params_folder / discrimination_report_params_file, "rb") as file:
-            self.discrimination_report_params = json.load(file)
+class Color_Table:
+    """
+    Red, green and background colors for every alpha achievable on the
+    8-bit grid (multiples of 1/255 up to gamma), computed once from the
+    calibration polynomials. Alphas are looked up at the nearest grid
+    value, so every block uses identical quantization and no color objects
+    are constructed per trial.
+    """
 
-        with open(params_folder / interval_probe_prarms_file, "rb") as file:
-            self.interval_probe_params = json.load(file)
+    def __init__(self, gamma: float, beta_polynomial, kappa_polynomial):
+        self.gamma = gamma
+        self.alphas = np.arange(0, int(np.floor(gamma * 255 + 1e-9)) + 1) / 255
+        n_alphas = len(self.alphas)
+
+        self.betas = np.broadcast_to(
+            np.asarray(beta_polynomial(self.alphas), dtype=float), (n_alphas,)
+        ).copy()
+        self.kappas = np.broadcast_to(
+            np.asarray(kappa_polynomial(self.alphas), dtype=float), (n_alphas,)
+        ).copy()
+
+        full_gamma = np.full(n_alphas, gamma)
+        zeros = np.zeros(n_alphas)
+        self.red_rgb1 = np.column_stack([full_gamma, self.alphas, zeros])
+        self.green_rgb1 = self.betas[:, None] * np.column_stack(
+            [self.alphas, full_gamma, zeros]
+        )
+        self.background_rgb1 = self.kappas[:, None] * np.full((n_alphas, 3), gamma)
 
-        with open(params_folder / stimuli_codes_file, "rb") as file:
-            self.stimuli_codes = json.load(file)
+        self.red_rgb255 = np.round(self.red_rgb1 * 255).astype(int)
+        self.green_rgb255 = np.round(self.green_rgb1 * 255).astype(int)
+        self.background_rgb255 = np.round(self.background_rgb1 * 255).astype(int)
 
-        # self.red_colors = pd.read_excel(params_folder / reds_values_file, header=None)
-        # self.green_colors = pd.read_excel(
-        #     params_folder / green_values_file, header=None
-        # )
+        self._red_colors = [colors.Color(rgb1, space="rgb1") for rgb1 in self.red_rgb1]
+        self._green_colors = [
+            colors.Color(rgb1, space="rgb1") for rgb1 in self.green_rgb1
+        ]
+        self._background_colors = [
+            colors.Color(rgb1, space="rgb1") for rgb1 in self.background_rgb1
+        ]
 
-    @property
-    def px_per_deg(self):
-        cm_per_degree = self.screen_params["distance_to_screen__cm"] * math.tan(
-            math.radians(1)
-        )
-        y_px_per_cm = (
-            self.screen_params["resolution_y__px"]
-            / self.screen_params["screen_height__cm"]
-        )
-        x_px_per_cm = (
-            self.screen_params["resolution_x__px"]
-            / self.screen_params["screen_width__cm"]
-        )
-        px_per_cm = (y_px_per_cm + x_px_per_cm) / 2
-        return px_per_cm * cm_per_degree
+    def get_index(self, alpha: float) -> int:
+        return int(np.clip(round(alpha * 255), 0, len(self.alphas) - 1))
 
-    @property
-    def background_color_0(self):
-        backgroup_rgb1 = self.visual_params["background_0_rgb1"]
-        return colors.Color(backgroup_rgb1, space="rgb1")
+    def get_alpha(self, alpha: float) -> float:
+        return float(self.alphas[self.get_index(alpha)])
 
-    @property
-    def frame_color(self):
-        frame_color_rgb1 = self.visual_params["frame_rgb1"]
-        return colors.Color(frame_color_rgb1, space="rgb1")
+    def get_beta(self, alpha: float) -> float:
+        return float(self.betas[self.get_index(alpha)])
+
+    def get_colors(self, alpha: float) -> dict:
+        ialpha = self.get_index(alpha)
+        return {"red": self._red_colors[ialpha], "green": self._green_colors[ialpha]}
+
+    def get_background_color(self, alpha: float) -> colors.Color:
+        return self._background_colors[self.get_index(alpha)]
+
+
+class Held_Key_Accelerator:
+    """
+    Converting key presses into value changes with acceleration:
+    every tap changes the value by one `step`, while a key is held longer
+    than `hold_delay` seconds the value keeps changing at a rate ramping
+    from `initial_rate` to `max_rate` steps per second over `ramp_duration`.
+
+    Held keys are tracked with a pyglet key state handler on the window;
+    without it (non-pyglet backends) every key event counts as a tap.
+    """
+
+    def __init__(
+        self,
+        window: visual.Window,
+        increase_keys: list,
+        decrease_keys: list,
+        step: float,
+        hold_delay: float = 0.3,
+        initial_rate: float = 10,
+        max_rate: float = 60,
+        ramp_duration: float = 1.5,
+    ):
+        self.window = window
+        self.step = step
+        self.hold_delay = hold_delay
+        self.initial_rate = initial_rate
+        self.max_rate = max_rate
+        self.ramp_duration = ramp_duration
+        self.key_signs = {key_name: 1 for key_name in increase_keys}
+        self.key_signs.update({key_name: -1 for key_name in decrease_keys})
+
+        self._key_state = None
+        self._key_codes = {}
+        try:
+            from pyglet.window import key as pyglet_key
+
+            self._key_state = pyglet_key.KeyStateHandler()
+            self.window.winHandle.push_handlers(self._key_state)
+            self._key_codes = {
+                key_name: getattr(pyglet_key, key_name.upper(), None)
+                for key_name in self.key_signs
+            }
+        except (ImportError, AttributeError):
+            self._key_state = None
+
+        self._was_down = {key_name: False for key_name in self.key_signs}
+        self._hold_start = {key_name: None for key_name in self.key_signs}
+        self._last_time = time.perf_counter()
+
+    def _is_down(self, key_name: str) -> bool:
+        if self._key_state is None or self._key_codes[key_name] is None:
+            return False
+        return self._key_state[self._key_codes[key_name]]
+
+    def get_change(self, keys_pressed: list) -> float:
+        """Value change for all key events queued since the last call"""
+        now = time.perf_counter()
+        change = 0.0
+
+        # taps; repeated events of an already held key are OS auto-repeat
+        for key_name in keys_pressed:
+            if key_name in self.key_signs and not self._was_down[key_name]:
+                change += self.key_signs[key_name] * self.step
+
+        for key_name, sign in self.key_signs.items():
+            is_down = self._is_down(key_name)
+            if not is_down:
+                self._hold_start[key_name] = None
+            elif self._hold_start[key_name] is None:
+                self._hold_start[key_name] = now
+            else:
+                held_for = now - self._hold_start[key_name] - self.hold_delay
+                if held_for > 0:
+                    ramp = min(held_for / self.ramp_duration, 1)
+                    rate = self.initial_rate + (self.max_rate - self.initial_rate) * ramp
+                    change += sign * self.step * rate * (now - self._last_time)
+            self._was_down[key_name] = is_down
+
+        self._last_time = now
+        return change
+
+    def close(self):
+        if self._key_state is not None:
+            self.window.winHandle.remove_handlers(self._key_state)
+            self._key_state = None
 
 
 class Calibrator:
@@ -138,9 +633,25 @@ class Calibrator:
         B_color_rgb1: list,
         field_size: int,
         background_color: colors.Color,
+        flicker_frequency: int = 15,
+        beta_0_jitter: float = 0.0,
+        frame_period: float | None = None,
+        rng: np.random.Generator | None = None,
     ):
+        """
+        beta_0_jitter: the trial starts from beta_0 shifted by a uniform
+        random offset within +/- beta_0_jitter (avoids anchoring when beta_0
+        is a prior prediction)
+        frame_period: measured frame period of the window (see
+        measure_frame_period), 1 / refresh_rate if None
+        rng: generator of the beta_0 offset (e.g. derived from the session seed)
+        """
         self.window = window
         self.refresh_rate = refresh_rate
+        self.frame_period = 1 / refresh_rate if frame_period is None else frame_period
+        self.flicker_frequency = flicker_frequency
+        self.beta_0_jitter = beta_0_jitter
+        self.rng = np.random.default_rng() if rng is None else rng
         self.mouse = mouse
         self.beta_0 = beta_0
         self.beta_increment = beta_increment
@@ -149,85 +660,137 @@ class Calibrator:
         self.B_color_vals_0 = B_color_rgb1
         self.field_size = field_size
         self.window.color = background_color
+        self.flicker_log = {}
 
         if calibration_type not in ["checkerboard", "single_square"]:
             raise ValueError(
                 "Calibration is defined only for 'checkerboard' or 'single_square' types"
             )
-        if refresh_rate % (15 * 2) != 0:
-            raise ValueError("Refresh rate of the screen should be a multiple of 30")
-
-    def _get_checkerboard(self, color_list):
-        squares = []
+        if refresh_rate % (flicker_frequency * 2) != 0:
+            raise ValueError(
+                f"Refresh rate of the screen should be a multiple of {flicker_frequency * 2}"
+            )
 
+    def _get_checkerboard(self) -> visual.ElementArrayStim:
         q = int(self.field_size / 6)  # scaler
 
-        color_i = 0
-        for x in np.linspace(-2.5, 2.5, 6):
-            for y in np.linspace(-2.5, 2.5, 6):
-                square = visual.Rect(
-                    units="pix",
-                    win=self.window,
-                    width=int(q / 1.05),
-                    height=int(q / 1.05),
-                    pos=(x * q, y * q),
-                    fillColor=color_list[color_i],
-                )
-                squares.append(square)
-                color_i += 1
-        
-        return squares
+        xys = [
+            (x * q, y * q)
+            for x in np.linspace(-2.5, 2.5, 6)
+            for y in np.linspace(-2.5, 2.5, 6)
+        ]
+        board = visual.ElementArrayStim(
+            units="pix",
+            win=self.window,
+            fieldPos=(0, 0),
+            fieldSize=(self.field_size, self.field_size),
+            fieldShape="square",
+            nElements=len(xys),
+            sizes=int(q / 1.05),
+            xys=xys,
+            colors=np.zeros((len(xys), 3)),
+            colorSpace="rgb",
+            elementTex=None,
+            elementMask=None,
+        )
+        return board
 
     def run_calibration_trial(self) -> float:
         beta = self.beta_0
-        A_color_vals = copy.copy(self.A_color_vals_0)
-        B_color_vals = copy.copy(self.B_color_vals_0)
-        B_color_vals.rgb1 = self.B_color_vals_0.rgb1 * beta
+        if self.beta_0_jitter > 0:
+            beta += float(self.rng.uniform(-self.beta_0_jitter, self.beta_0_jitter))
+        beta_start = beta
+        A_color_rgb1 = np.array(self.A_color_vals_0.rgb1)
+        B_color_rgb1_0 = np.array(self.B_color_vals_0.rgb1)
 
         event.clearEvents(eventType="keyboard")
 
         if self.calibration_type == "checkerboard":
-            color_list_even = (
-                [B_color_vals, A_color_vals] * 3
-                + [A_color_vals, B_color_vals] * 3
-            ) * 3
-            color_list_odd = (
-                [A_color_vals, B_color_vals] * 3
-                + [B_color_vals, A_color_vals] * 3
-            ) * 3
-            colors = [color_list_even,  color_list_odd]
-            boards = [self._get_checkerboard(color) for color in colors]
-            #print("before", B_color_vals)
-
-            i_frame = -1
-            while True:
-                i_frame += 1
-                board = boards[(i_frame % 4)//2]
+            # B squares of the two flicker phases, in the order of _get_checkerboard
+            is_B_even = np.array(
+                ([True, False] * 3 + [False, True] * 3) * 3
+            )
+            is_B = np.stack([is_B_even, ~is_B_even])
+
+            # colors (psychopy "rgb" space) of every square in both phases
+            board_colors = np.empty(is_B.shape + (3,))
+            board_colors[~is_B] = A_color_rgb1 * 2 - 1
+            board_colors[is_B] = B_color_rgb1_0 * beta * 2 - 1
+
+            board = self._get_checkerboard()
+
+            # the phase is derived from the flip timestamps, so that dropped
+            # frames do not shift the flicker and change its frequency
+            frame_period = self.frame_period
+            frames_per_phase = self.refresh_rate // (2 * self.flicker_frequency)
+            n_phase_changes = 0
+            n_dropped_frames = 0
+
+            accelerator = Held_Key_Accelerator(
+                window=self.window,
+                increase_keys=["up"],
+                decrease_keys=["down"],
+                step=self.beta_increment,
+            )
 
-                for obj in board:
-                    obj.draw()
-                self.window.flip()
+            first_flip_time = self.window.flip()
+            last_flip_time = first_flip_time
+            last_phase = None
+            while True:
+                next_frame = round((last_flip_time - first_flip_time) / frame_period) + 1
+                phase = (next_frame // frames_per_phase) % 2
+                if last_phase is not None and phase != last_phase:
+                    n_phase_changes += 1
+                last_phase = phase
+
+                board.colors = board_colors[phase]
+                board.draw()
+                flip_time = self.window.flip()
+                n_dropped_frames += max(
+                    round((flip_time - last_flip_time) / frame_period) - 1, 0
+                )
+                last_flip_time = flip_time
 
                 current_keys = event.getKeys()
                 if len(current_keys) > 0:
-                    print("PRESSED", current_keys)
-                    if "up" in current_keys:
-                        beta += self.beta_increment
-                    elif "down" in current_keys:
-                        beta -= self.beta_increment 
-                    elif "space" in current_keys:
-                        break
-
-                    B_color_vals.rgb1 = self.B_color_vals_0.rgb1 * beta
-                    for board in boards:
-                        green_squares = [obj for obj in board if obj.fillColor[0] < obj.fillColor[1]]
-                        for obj in green_squares:
-                            obj.setColor(B_color_vals)
-                        #print("posle", obj.fillColor)           
+                    session_log.debug("calibration_keys", keys=current_keys, beta=beta)
+                if "space" in current_keys:
+                    break
+
+                beta_change = accelerator.get_change(current_keys)
+                if beta_change != 0:
+                    beta += beta_change
+                    board_colors[is_B] = B_color_rgb1_0 * beta * 2 - 1
+
+            accelerator.close()
+
+            duration = last_flip_time - first_flip_time
+            self.flicker_log = {
+                "beta_start": beta_start,
+                "target_frequency__hz": self.flicker_frequency,
+                "achieved_frequency__hz": (
+                    n_phase_changes / 2 / duration if duration > 0 else None
+                ),
+                "duration__s": duration,
+                "frame_period__s": frame_period,
+                "dropped_frames": n_dropped_frames,
+            }
 
         return beta
 
 
+def measure_frame_period(window: visual.Window, refresh_rate: int) -> float:
+    """
+    Frame period measured from the flips of the window, as the actual
+    refresh rate deviates slightly from the nominal one; 1 / refresh_rate
+    if the measurement is unstable
+    """
+    measured_refresh_rate = window.getActualFrameRate()
+    if measured_refresh_rate is None:
+        return 1 / refresh_rate
+    return 1 / measured_refresh_rate
+
+
 def check_beta_plot(
     window: visual.Window,
     mouse: event.Mouse,
@@ -236,44 +799,20 @@ def check_beta_plot(
     alpha_decrement: float,
     betas: dict,
 ) -> tuple[bool, dict]:
-    is_judgement_made = False
-    button_pressed_index = None
     experimenter_approved = False
 
-    alphas_used = [gamma - (alpha_decrement * contrast) for contrast in range(len(betas))]
-    betas_ordered = [betas[i] for i, alpha in enumerate(alphas_used)]
+    contrasts_used = sorted(betas.keys())
+    alphas_used = [gamma - (alpha_decrement * contrast) for contrast in contrasts_used]
+    betas_ordered = [betas[contrast] for contrast in contrasts_used]
 
     polynomial = np.poly1d(np.polyfit(x=alphas_used, y=betas_ordered, deg=2))
-    betas_fitted = polynomial(alphas_used)
-
-    temporal_image_file = Path("temporal_image.png")
-    matplotlib.use("Agg")
-    matplotlib.rcParams["axes.edgecolor"] = "white"
-    matplotlib.rcParams["xtick.color"] = "white"
-    matplotlib.rcParams["ytick.color"] = "white"
-    matplotlib.rcParams["axes.labelcolor"] = "white"
-    plt.cla()
-    plt.plot(
-        alphas_used,
-        betas_ordered,
-        label="Calibration Data",
-        color="yellow",
-    )
-    plt.plot(
-        alphas_used,
-        betas_fitted,
-        label="Polynomial Fit",
-        color="magenta",
-    )
-    plt.xlabel("Contrast Level")
-    plt.ylabel("Beta")
-    plt.savefig(temporal_image_file, transparent=True)
-    plot = visual.ImageStim(
-        units="pix",
-        win=window,
-        image=temporal_image_file,
-        interpolate=True,
-        texRes=1024,
+
+    plot = _get_beta_plot(
+        window=window,
+        field_size=field_size,
+        alphas=np.array(alphas_used),
+        betas=np.array(betas_ordered),
+        polynomial=polynomial,
     )
     judgement_text = visual.TextBox2(
         units="pix",
@@ -299,17 +838,17 @@ def check_beta_plot(
         for i in range(2)
     ]
 
-    mouse.setExclusive(False)
-    while not is_judgement_made:
-        plot.draw()
-        judgement_text.draw()
+    def poll():
         for ibutton, button in enumerate(buttons):
-            button.draw()
             if mouse.isPressedIn(shape=button, buttons=[0]):
-                button_pressed_index = ibutton
-                is_judgement_made = True
+                return ibutton
+        return None
 
-        window.flip()
+    # the cursor is drawn by the OS, so the plot itself never changes
+    mouse.setExclusive(False)
+    button_pressed_index = Idle_Screen(window=window, name="beta_plot").wait(
+        draw_list=plot + [judgement_text] + buttons, poll=poll
+    )
     mouse.setExclusive(True)
 
     if button_pressed_index == 0:
@@ -317,16 +856,188 @@ def check_beta_plot(
     elif button_pressed_index == 1:
         experimenter_approved == False
 
-    temporal_image_file.unlink()
-
     return (
         experimenter_approved,
         polynomial,
     )
 
 
+def _get_quadratic_fit(alphas: np.ndarray, betas: np.ndarray, min_sigma: float):
+    """
+    Least squares quadratic fit on centered alphas.
+    Returns the design matrix, coefficients, residuals, the residual SD
+    (not below min_sigma, the resolution of the beta adjustment)
+    and the centering offset.
+    """
+    alpha_center = alphas.mean()
+    design = np.vander(alphas - alpha_center, 3)
+    coefficients = np.linalg.lstsq(design, betas, rcond=None)[0]
+    residuals = betas - design @ coefficients
+    dof = len(alphas) - 3
+    sigma = np.sqrt(np.sum(residuals**2) / dof) if dof > 0 else 0.0
+    return design, coefficients, residuals, max(sigma, min_sigma), alpha_center
+
+
+def get_calibration_fit_band(
+    alphas: np.ndarray, betas: np.ndarray, alphas_grid: np.ndarray, min_sigma: float
+) -> np.ndarray:
+    """
+    Half-width (2 standard errors) of the confidence band of the quadratic
+    beta(alpha) fit at every alpha of alphas_grid
+    """
+    design, _coefficients, _residuals, sigma, alpha_center = _get_quadratic_fit(
+        np.asarray(alphas, dtype=float), np.asarray(betas, dtype=float), min_sigma
+    )
+    covariance = sigma**2 * np.linalg.pinv(design.T @ design)
+    design_grid = np.vander(np.asarray(alphas_grid, dtype=float) - alpha_center, 3)
+    variance = np.einsum("ij,jk,ik->i", design_grid, covariance, design_grid)
+    return 2 * np.sqrt(np.maximum(variance, 0))
+
+
+def get_outlying_calibration_points(
+    alphas: np.ndarray, betas: np.ndarray, min_sigma: float, n_sigma: float = 2
+) -> np.ndarray:
+    """
+    Indices of the points deviating from the quadratic fit by more than
+    n_sigma residual SDs (or of the single largest deviation if none does)
+    """
+    _design, _coefficients, residuals, sigma, _alpha_center = _get_quadratic_fit(
+        np.asarray(alphas, dtype=float), np.asarray(betas, dtype=float), min_sigma
+    )
+    outlying = np.flatnonzero(np.abs(residuals) > n_sigma * sigma)
+    if len(outlying) == 0:
+        outlying = np.array([np.argmax(np.abs(residuals))])
+    return outlying
+
+
+def _get_beta_plot(
+    window: visual.Window,
+    field_size: int,
+    alphas: np.ndarray,
+    betas: np.ndarray,
+    polynomial: np.poly1d,
+) -> list:
+    """
+    Calibration data and polynomial fit drawn with psychopy primitives
+    in a box of 1.2 x 0.9 field sizes around the screen center
+    """
+    left, right = -0.6 * field_size, 0.6 * field_size
+    bottom, top = -0.4 * field_size, 0.5 * field_size
+    letter_height = int(field_size / 25)
+
+    alphas_dense = np.linspace(alphas.min(), alphas.max(), 100)
+    betas_fitted = polynomial(alphas_dense)
+    x_range = np.array([alphas.min(), alphas.max()])
+    y_all = np.concatenate([betas, betas_fitted])
+    y_margin = max(0.05 * np.ptp(y_all), 1e-3)
+    y_range = np.array([y_all.min() - y_margin, y_all.max() + y_margin])
+    if np.ptp(x_range) == 0:
+        x_range = x_range + np.array([-0.5, 0.5]) * 1e-2
+
+    def to_pix(x, y):
+        x_pix = left + (x - x_range[0]) / np.ptp(x_range) * (right - left)
+        y_pix = bottom + (y - y_range[0]) / np.ptp(y_range) * (top - bottom)
+        return np.column_stack([x_pix, y_pix])
+
+    order = np.argsort(alphas)
+    plot = [
+        visual.ShapeStim(
+            units="pix",
+            win=window,
+            vertices=[(left, top), (left, bottom), (right, bottom)],
+            closeShape=False,
+            lineColor="white",
+            lineWidth=2,
+            fillColor=None,
+        ),
+        visual.ShapeStim(
+            units="pix",
+            win=window,
+            vertices=to_pix(alphas[order], betas[order]),
+            closeShape=False,
+            lineColor="yellow",
+            lineWidth=3,
+            fillColor=None,
+        ),
+        visual.ShapeStim(
+            units="pix",
+            win=window,
+            vertices=to_pix(alphas_dense, betas_fitted),
+            closeShape=False,
+            lineColor="magenta",
+            lineWidth=3,
+            fillColor=None,
+        ),
+    ]
+
+    for x_tick in np.linspace(x_range[0], x_range[1], 5):
+        x_pix = to_pix(x_tick, y_range[0])[0, 0]
+        plot.append(
+            visual.TextStim(
+                units="pix",
+                win=window,
+                text=f"{x_tick:.2f}",
+                pos=(x_pix, bottom - letter_height),
+                height=letter_height,
+                color="white",
+            )
+        )
+    for y_tick in np.linspace(y_range[0], y_range[1], 5):
+        y_pix = to_pix(x_range[0], y_tick)[0, 1]
+        plot.append(
+            visual.TextStim(
+                units="pix",
+                win=window,
+                text=f"{y_tick:.3f}",
+                pos=(left - 2 * letter_height, y_pix),
+                height=letter_height,
+                color="white",
+            )
+        )
+
+    plot += [
+        visual.TextStim(
+            units="pix",
+            win=window,
+            text="Contrast Level",
+            pos=(0, bottom - 2.5 * letter_height),
+            height=letter_height,
+            color="white",
+        ),
+        visual.TextStim(
+            units="pix",
+            win=window,
+            text="Beta",
+            pos=(left - 4.5 * letter_height, (top + bottom) / 2),
+            height=letter_height,
+            ori=-90,
+            color="white",
+        ),
+        visual.TextStim(
+            units="pix",
+            win=window,
+            text="Calibration Data",
+            pos=(right - 4 * letter_height, top - letter_height),
+            height=letter_height,
+            color="yellow",
+        ),
+        visual.TextStim(
+            units="pix",
+            win=window,
+            text="Polynomial Fit",
+            pos=(right - 4 * letter_height, top - 2.5 * letter_height),
+            height=letter_height,
+            color="magenta",
+        ),
+    ]
+    return plot
+
+
 ### old calibration version with tkinter
 def check_beta_plot_2(betas: dict) -> tuple[bool, dict]:
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
     experimenter_approved = dict(value=None)
 
     contrast_list_ascending = [i for i in range(len(betas))]
@@ -0,0 +1,130 @@
+from pathlib import Path
+import json
+
+import numpy as np
+
+
+class Quest_Plus:
+    """
+    Bayesian adaptive threshold estimation (QUEST+) for the yes/no
+    detection of the DCM stimulus.
+
+    The probability of a "yes" report decreases with alpha
+    (a higher alpha means a lower red/green contrast):
+
+        p_yes(alpha) = fa + (1 - fa - lapse) / (1 + exp(slope * (alpha - threshold)))
+
+    The posterior over (threshold, slope, lapse) is kept on a NumPy grid.
+    The next alpha is chosen among the achievable 8-bit values
+    (multiples of 1/255 up to gamma) by minimizing the expected posterior
+    entropy. Both the update and the stimulus selection are single
+    vectorized operations over precomputed likelihood tables.
+    """
+
+    def __init__(
+        self,
+        gamma: float,
+        thresholds: np.ndarray | None = None,
+        slopes: np.ndarray = np.geomspace(20, 400, 12),
+        lapses: np.ndarray = np.array([0.0, 0.01, 0.02, 0.04]),
+        false_alarm_rate: float = 0.02,
+        threshold_width: float = 2 / 255,
+        max_trials: int = 80,
+        min_trials: int = 10,
+    ):
+        self.gamma = gamma
+        self.alphas = np.arange(0, int(np.floor(gamma * 255)) + 1) / 255
+        if thresholds is None:
+            thresholds = self.alphas
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.slopes = np.asarray(slopes, dtype=float)
+        self.lapses = np.asarray(lapses, dtype=float)
+        self.false_alarm_rate = false_alarm_rate
+        self.threshold_width = threshold_width
+        self.max_trials = max_trials
+        self.min_trials = min_trials
+
+        # likelihood of "yes" as (alpha, threshold, slope, lapse), flattened over parameters
+        alpha = self.alphas[:, None, None, None]
+        threshold = self.thresholds[None, :, None, None]
+        slope = self.slopes[None, None, :, None]
+        lapse = self.lapses[None, None, None, :]
+        p_yes = false_alarm_rate + (1 - false_alarm_rate - lapse) / (
+            1 + np.exp(np.clip(slope * (alpha - threshold), -50, 50))
+        )
+        self._p_yes = p_yes.reshape(len(self.alphas), -1)
+        self._p_no = 1 - self._p_yes
+        self._p_yes_log_p_yes = self._p_yes * _safe_log(self._p_yes)
+        self._p_no_log_p_no = self._p_no * _safe_log(self._p_no)
+        self._param_shape = p_yes.shape[1:]
+
+        self.posterior = np.full(self._p_yes.shape[1], 1 / self._p_yes.shape[1])
+        self.n_trials = 0
+        self.history = []
+
+    def next_alpha(self) -> float:
+        # H(posterior | r) = log P(r) - (L_r @ (p log p) + (L_r log L_r) @ p) / P(r),
+        # so the expected entropy over responses reduces to matrix-vector products
+        posterior_log_posterior = self.posterior * _safe_log(self.posterior)
+        expected_entropy = np.zeros(len(self.alphas))
+        for likelihood, likelihood_log_likelihood in [
+            (self._p_yes, self._p_yes_log_p_yes),
+            (self._p_no, self._p_no_log_p_no),
+        ]:
+            p_response = likelihood @ self.posterior
+            expected_entropy += p_response * _safe_log(p_response) - (
+                likelihood @ posterior_log_posterior
+                + likelihood_log_likelihood @ self.posterior
+            )
+        return float(self.alphas[np.argmin(expected_entropy)])
+
+    def update(self, alpha: float, response: bool):
+        ialpha = int(np.argmin(np.abs(self.alphas - alpha)))
+        likelihood = self._p_yes[ialpha] if response else self._p_no[ialpha]
+        self.posterior *= likelihood
+        self.posterior /= self.posterior.sum()
+        self.n_trials += 1
+        self.history.append((float(self.alphas[ialpha]), bool(response)))
+
+    @property
+    def threshold_posterior(self) -> np.ndarray:
+        return self.posterior.reshape(self._param_shape).sum(axis=(1, 2))
+
+    @property
+    def threshold_estimate(self) -> float:
+        return float(self.threshold_posterior @ self.thresholds)
+
+    @property
+    def threshold_sd(self) -> float:
+        marginal = self.threshold_posterior
+        mean = marginal @ self.thresholds
+        return float(np.sqrt(marginal @ (self.thresholds - mean) ** 2))
+
+    @property
+    def is_finished(self) -> bool:
+        if self.n_trials >= self.max_trials:
+            return True
+        return (self.n_trials >= self.min_trials) and (
+            self.threshold_sd < self.threshold_width
+        )
+
+    def get_summary(self) -> dict:
+        marginal = self.posterior.reshape(self._param_shape)
+        return {
+            "threshold": self.threshold_estimate,
+            "threshold_sd": self.threshold_sd,
+            "slope": float(marginal.sum(axis=(0, 2)) @ self.slopes),
+            "lapse": float(marginal.sum(axis=(0, 1)) @ self.lapses),
+            "n_trials": self.n_trials,
+            "history": self.history,
+        }
+
+    def save_summary(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.get_summary(), f, indent=4)
+
+
+def _safe_log(values: np.ndarray) -> np.ndarray:
+    """Natural logarithm with log(0) set to 0 (as used in p * log p)"""
+    return np.log(values, where=values > 0, out=np.zeros_like(values))
@@ -0,0 +1,153 @@
+import gc
+import os
+import sys
+import time
+
+from session_log import session_log
+
+
+class Real_Time_Mode:
+    """
+    Protection of frame-critical epochs (stimulus presentation) from
+    garbage collection and OS scheduling.
+
+    Objects allocated during setup are moved out of the collector's reach
+    with gc.freeze() on activation. Automatic garbage collection is
+    disabled during critical epochs only; the collections deferred by an
+    epoch run in `housekeeping()`, which is meant for ITIs and response
+    waits. During critical epochs the process
+    priority is raised and the process is pinned to `cpu_affinity`
+    (all cores but core 0 by default). Priority and affinity need psutil
+    and the corresponding OS permissions; if unavailable, only the GC
+    control is applied.
+    """
+
+    def __init__(self, cpu_affinity: list | None = None):
+        try:
+            import psutil
+        except ImportError:
+            psutil = None
+            session_log.warning(
+                "psutil_missing", detail="process priority and affinity are not changed"
+            )
+        self._psutil = psutil
+        self._process = None if psutil is None else psutil.Process()
+
+        self.cpu_affinity = cpu_affinity
+        if self._process is not None and cpu_affinity is None:
+            try:
+                available = self._process.cpu_affinity()
+                self.cpu_affinity = available[1:] if len(available) > 1 else available
+            except (AttributeError, psutil.Error):
+                self.cpu_affinity = None  # not supported on macOS
+
+        self.is_active = False
+        self.is_critical = False
+        self._was_gc_enabled = gc.isenabled()
+        self._default_priority = None
+        self._default_affinity = None
+        self._can_raise_priority = self._process is not None
+        self._can_set_affinity = self.cpu_affinity is not None
+
+        self.collection_times = []
+        self.n_deferred_collections = 0
+        self.n_collections_in_critical = 0
+        self.critical_time = 0.0
+        self._critical_start = None
+
+    def _on_collection(self, phase: str, _info: dict):
+        if phase == "start" and self.is_critical:
+            self.n_collections_in_critical += 1
+
+    def activate(self):
+        if self.is_active:
+            return
+        self._was_gc_enabled = gc.isenabled()
+        gc.collect()
+        gc.freeze()
+        gc.callbacks.append(self._on_collection)
+        if self._process is not None:
+            self._default_priority = self._process.nice()
+            if self._can_set_affinity:
+                self._default_affinity = self._process.cpu_affinity()
+        self.is_active = True
+
+    def _set_priority(self, is_raised: bool):
+        if not self._can_raise_priority:
+            return
+        if is_raised:
+            priority = (
+                self._psutil.HIGH_PRIORITY_CLASS if sys.platform == "win32" else -10
+            )
+        else:
+            priority = self._default_priority
+        try:
+            self._process.nice(priority)
+        except (self._psutil.AccessDenied, PermissionError):
+            self._can_raise_priority = False
+            session_log.warning(
+                "priority_denied", detail="only GC control is applied"
+            )
+
+    def _set_affinity(self, is_pinned: bool):
+        if not self._can_set_affinity:
+            return
+        try:
+            self._process.cpu_affinity(
+                self.cpu_affinity if is_pinned else self._default_affinity
+            )
+        except (AttributeError, ValueError, self._psutil.Error):
+            self._can_set_affinity = False
+            session_log.warning("affinity_unsupported")
+
+    def enter_critical(self):
+        if not self.is_active or self.is_critical:
+            return
+        gc.disable()
+        self._set_priority(is_raised=True)
+        self._set_affinity(is_pinned=True)
+        self.is_critical = True
+        self._critical_start = time.perf_counter()
+
+    def leave_critical(self):
+        if not self.is_critical:
+            return
+        self.is_critical = False
+        self.critical_time += time.perf_counter() - self._critical_start
+        self._set_priority(is_raised=False)
+        self._set_affinity(is_pinned=False)
+        # automatic generation 0 collections that would have happened meanwhile
+        self.n_deferred_collections += gc.get_count()[0] // max(gc.get_threshold()[0], 1)
+        if self._was_gc_enabled:
+            gc.enable()
+
+    def housekeeping(self):
+        """Running the deferred collections; call only outside of critical epochs"""
+        if not self.is_active or self.is_critical:
+            return
+        start = time.perf_counter()
+        gc.collect()
+        self.collection_times.append(time.perf_counter() - start)
+
+    def get_report(self) -> dict:
+        return {
+            "n_deferred_collections": self.n_deferred_collections,
+            "n_housekeeping_collections": len(self.collection_times),
+            "collection_time_total__s": float(sum(self.collection_times)),
+            "collection_time_max__s": (
+                float(max(self.collection_times)) if self.collection_times else None
+            ),
+            "n_collections_in_critical": self.n_collections_in_critical,
+            "critical_time__s": self.critical_time,
+            "is_priority_raised": self._can_raise_priority,
+            "cpu_affinity": self.cpu_affinity if self._can_set_affinity else None,
+            "pid": os.getpid(),
+        }
+
+    def deactivate(self):
+        if not self.is_active:
+            return
+        self.leave_critical()
+        gc.callbacks.remove(self._on_collection)
+        gc.unfreeze()
+        self.is_active = False
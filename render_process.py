@@ -0,0 +1,310 @@
+from multiprocessing import Lock, Process, shared_memory
+from pathlib import Path
+import pickle
+import struct
+import time
+import traceback
+
+import numpy as np
+
+from misc import Parameters
+from block_runner import Renderer, write_record
+from idle import IDLE_LOG
+from session_log import session_log
+
+_HEADER_SIZE = 16  # bytes written, bytes read (both monotonic uint64)
+_LENGTH = struct.Struct("<Q")
+
+# Renderer methods the render process executes on request
+RENDER_COMMANDS = [
+    "set_calibration",
+    "run_block",
+    "display_text",
+    "run_stereo_trial",
+    "start_prefetching",
+    "stop_prefetching",
+    "run_dcm_trial",
+    "run_slider_trial",
+    "run_adjustment",
+    "run_calibration_level",
+    "check_calibration",
+]
+
+
+class Shared_Memory_Channel:
+    """
+    One-directional message channel between two processes: a byte ring
+    buffer in shared memory with one writer and one reader. Messages are
+    pickled; `send` and `receive` do not wait for the other side (they
+    return False / None when the buffer is full / empty).
+    The writer publishes a message by advancing the write counter only
+    after the payload is in place. The counters are read and advanced
+    under `lock` (a multiprocessing.Lock shared by both sides): acquiring
+    and releasing it are memory barriers, so the payload is visible
+    before the counter on weakly ordered CPUs (ARM) too. The lock is only
+    held for the counter access, never during a copy.
+    """
+
+    def __init__(
+        self, name: str | None = None, capacity: int = 4 * 1024 * 1024, lock=None
+    ):
+        self.is_owner = name is None
+        if lock is None:
+            if not self.is_owner:
+                raise ValueError("Attaching to a channel needs the lock of its owner")
+            lock = Lock()
+        self.lock = lock
+        if self.is_owner:
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=_HEADER_SIZE + capacity
+            )
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.name = self._memory.name
+        self.capacity = self._memory.size - _HEADER_SIZE
+        self._counters = np.ndarray((2,), dtype=np.uint64, buffer=self._memory.buf)
+        if self.is_owner:
+            self._counters[:] = 0
+
+    def _copy_in(self, position: int, data: bytes):
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        buffer = self._memory.buf
+        buffer[_HEADER_SIZE + start : _HEADER_SIZE + start + first] = data[:first]
+        if first < len(data):
+            buffer[_HEADER_SIZE : _HEADER_SIZE + len(data) - first] = data[first:]
+
+    def _copy_out(self, position: int, length: int) -> bytes:
+        start = position % self.capacity
+        first = min(length, self.capacity - start)
+        buffer = self._memory.buf
+        data = bytes(buffer[_HEADER_SIZE + start : _HEADER_SIZE + start + first])
+        if first < length:
+            data += bytes(buffer[_HEADER_SIZE : _HEADER_SIZE + length - first])
+        return data
+
+    def send(self, message) -> bool:
+        payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        size = _LENGTH.size + len(payload)
+        if size > self.capacity:
+            raise ValueError(f"Message of {size} bytes exceeds the channel capacity")
+        with self.lock:
+            written, read = int(self._counters[0]), int(self._counters[1])
+        if self.capacity - (written - read) < size:
+            return False
+        self._copy_in(written, _LENGTH.pack(len(payload)) + payload)
+        # only the writer moves the write counter
+        with self.lock:
+            self._counters[0] = written + size
+        return True
+
+    def receive(self):
+        with self.lock:
+            written, read = int(self._counters[0]), int(self._counters[1])
+        if written == read:
+            return None
+        (length,) = _LENGTH.unpack(self._copy_out(read, _LENGTH.size))
+        message = pickle.loads(self._copy_out(read + _LENGTH.size, length))
+        # only the reader moves the read counter
+        with self.lock:
+            self._counters[1] = read + _LENGTH.size + length
+        return message
+
+    def send_waiting(self, message, poll_interval: float = 0.001):
+        while not self.send(message):
+            time.sleep(poll_interval)
+
+    def receive_waiting(self, poll_interval: float = 0.001):
+        while True:
+            message = self.receive()
+            if message is not None:
+                return message
+            time.sleep(poll_interval)
+
+    def close(self):
+        del self._counters  # the buffer cannot be released while exported
+        self._memory.close()
+        if self.is_owner:
+            self._memory.unlink()
+
+
+class Render_Server:
+    """
+    Render side of the split architecture: owns the visual.Window through
+    a Renderer and executes the commands of Render_Client. Trial records
+    are sent back instead of written, so no file I/O happens in the
+    process that flips the window; the reports of the waiting screens are
+    sent back with every reply.
+    """
+
+    def __init__(
+        self,
+        params: Parameters,
+        commands: Shared_Memory_Channel,
+        results: Shared_Memory_Channel,
+        real_time: bool,
+    ):
+        self.commands = commands
+        self.results = results
+        # a forked process inherits the reports of the logic process
+        self._n_idle_reports_sent = len(IDLE_LOG)
+        self.renderer = Renderer(
+            params=params, real_time=real_time, save_record=self._send_record
+        )
+
+    def _send_record(self, path: Path, info: dict):
+        self.results.send_waiting(("record", str(path), info))
+
+    def _send_idle_reports(self):
+        if len(IDLE_LOG) > self._n_idle_reports_sent:
+            self.results.send_waiting(("idle", IDLE_LOG[self._n_idle_reports_sent:]))
+            self._n_idle_reports_sent = len(IDLE_LOG)
+
+    def serve(self):
+        while True:
+            command, payload = self.commands.receive_waiting()
+            if command == "close":
+                report = self.renderer.close()
+                self._send_idle_reports()
+                self.results.send_waiting(("done", report))
+                break
+            try:
+                if command not in RENDER_COMMANDS:
+                    raise ValueError(f"Unknown render command {command}")
+                result = getattr(self.renderer, command)(**payload)
+                self._send_idle_reports()
+                self.results.send_waiting(("done", result))
+            except Exception:
+                self._send_idle_reports()
+                self.results.send_waiting(("error", traceback.format_exc()))
+
+
+def render_main(
+    params: Parameters,
+    commands_name: str,
+    commands_lock,
+    results_name: str,
+    results_lock,
+    real_time: bool,
+    log_path: Path | None = None,
+):
+    """Entry point of the render process"""
+    if log_path is not None:
+        session_log.start(log_path)
+    commands = Shared_Memory_Channel(name=commands_name, lock=commands_lock)
+    results = Shared_Memory_Channel(name=results_name, lock=results_lock)
+    try:
+        Render_Server(
+            params=params, commands=commands, results=results, real_time=real_time
+        ).serve()
+    finally:
+        commands.close()
+        results.close()
+        session_log.close()
+
+
+class Render_Client:
+    """
+    Experiment-logic side of the split architecture, with the methods of
+    Renderer: each call is sent to the render process and waits for its
+    result; while a command runs, the trial records it sends back are
+    written to disk here and the reports of its waiting screens are added
+    to the local IDLE_LOG. The render process keeps its own session log
+    at `log_path`.
+    """
+
+    def __init__(
+        self, params: Parameters, real_time: bool = False, log_path: Path | None = None
+    ):
+        self.commands = Shared_Memory_Channel()
+        self.results = Shared_Memory_Channel()
+        self.process = Process(
+            target=render_main,
+            args=(
+                params,
+                self.commands.name,
+                self.commands.lock,
+                self.results.name,
+                self.results.lock,
+                real_time,
+                log_path,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+
+    def _request(self, command: str, payload: dict):
+        self.commands.send_waiting((command, payload))
+        while True:
+            message = self.results.receive()
+            if message is None:
+                if not self.process.is_alive():
+                    raise RuntimeError("The render process has stopped")
+                time.sleep(0.001)
+                continue
+
+            kind = message[0]
+            if kind == "record":
+                _, path, info = message
+                write_record(Path(path), info)
+            elif kind == "idle":
+                IDLE_LOG.extend(message[1])
+            elif kind == "done":
+                return message[1]
+            elif kind == "error":
+                raise RuntimeError(f"Render process error:\n{message[1]}")
+
+    def set_calibration(self, beta_polynomial=None, kappa_polynomial=None):
+        """Polynomials that are not np.poly1d (e.g. the defaults) are kept on the render side"""
+        self._request(
+            "set_calibration",
+            {
+                "beta_polynomial": (
+                    beta_polynomial if isinstance(beta_polynomial, np.poly1d) else None
+                ),
+                "kappa_polynomial": (
+                    kappa_polynomial if isinstance(kappa_polynomial, np.poly1d) else None
+                ),
+            },
+        )
+
+    def run_block(self, **spec) -> dict:
+        return self._request("run_block", spec)
+
+    def display_text(self, text: str, text_mode: str, termination_buttons: list) -> dict:
+        return self._request(
+            "display_text",
+            {"text": text, "text_mode": text_mode, "termination_buttons": termination_buttons},
+        )
+
+    def run_stereo_trial(self, **kwargs) -> dict:
+        return self._request("run_stereo_trial", kwargs)
+
+    def start_prefetching(self, alphas: list):
+        self._request("start_prefetching", {"alphas": alphas})
+
+    def stop_prefetching(self):
+        self._request("stop_prefetching", {})
+
+    def run_dcm_trial(self, **kwargs) -> dict:
+        return self._request("run_dcm_trial", kwargs)
+
+    def run_slider_trial(self, **kwargs) -> tuple[float, bool]:
+        return self._request("run_slider_trial", kwargs)
+
+    def run_adjustment(self, **kwargs) -> float:
+        return self._request("run_adjustment", kwargs)
+
+    def run_calibration_level(self, **kwargs) -> tuple[float, dict]:
+        return self._request("run_calibration_level", kwargs)
+
+    def check_calibration(self, betas: dict) -> tuple[bool, np.poly1d]:
+        return self._request("check_calibration", {"betas": betas})
+
+    def close(self) -> dict | None:
+        """Closing the render process; returns the report of its real-time mode, if active"""
+        report = self._request("close", {})
+        self.process.join(timeout=5)
+        self.commands.close()
+        self.results.close()
+        return report
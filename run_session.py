@@ -1,13 +1,17 @@
 from pathlib import Path
-import random
+import sys
 
 import tkinter as tk
 import numpy as np
 
 from experiment import Experiment
+from block_plan import draw_color_modes
 from misc import Parameters, Participant, get_gui_inputs
+from session_log import session_log
 
 IS_TESTING_REGIME_ON = True 
+IS_REAL_TIME_MODE_ON = True  # GC deferred to ITIs and raised priority during stimuli
+IS_RESUME_ON = "--resume" in sys.argv  # `python run_session.py --resume` continues a crashed session
 
 if IS_TESTING_REGIME_ON:
     sbj = Participant(
@@ -22,7 +26,8 @@ else:
         handedness=sbj_info["Handedness"],
     )
     sbj.create_participant_repo() 
-    sbj.save_demographical_info()
+    if not IS_RESUME_ON:
+        sbj.save_demographical_info()
 
 parameters = Parameters(
     screen_params_file=Path("parameters_screen.json"),
@@ -35,7 +40,12 @@ parameters = Parameters(
     interval_probe_prarms_file=Path("parameters_interval_probe.json"),
     stimuli_codes_file=Path("stimuli_codes.json"),
 )
-exp = Experiment(participant=sbj, params=parameters)
+exp = Experiment(
+    participant=sbj,
+    params=parameters,
+    real_time=IS_REAL_TIME_MODE_ON,
+    resume=IS_RESUME_ON,
+)
 exp.display_text(
     "Welcome!", text_mode="default", termination_buttons=["space", "enter"]
 )
@@ -53,7 +63,7 @@ if IS_TESTING_REGIME_ON:
         exp.run_color_contrast_calibration(calibration_type="background", n_calibration_contrasts=15, save_results = True)
         exp.run_color_contrast_calibration(calibration_type="DCF_colors", n_calibration_contrasts=15, save_results = True)
     except Exception as e:
-        print(f"Error occured:\n{e}")
+        session_log.error("calibration_failed", error=repr(e))
 else:
     exp.run_color_contrast_calibration(calibration_type="background", n_calibration_contrasts=15, save_results = True)
     exp.run_color_contrast_calibration(calibration_type="DCF_colors", n_calibration_contrasts=15, save_results = True)
@@ -71,7 +81,7 @@ exp.run_experimental_block(
     block_code="adaptation_high",
     n_trials=9,
     alphas =([0.2] * 3) + ([0.22] * 3) + ([0.24] * 3),
-    color_modes=[random.choice(["red", "green"]) for _i in range(9)],
+    color_modes=draw_color_modes(exp.session_seed, "adaptation_high", ["red", "green"], 9),
     detection_collection = False,
     discrimination_collection = False,
     forced_termination_buttons=["left", "right"],
@@ -85,7 +95,7 @@ exp.run_experimental_block(
     block_code="adaptation_low",
     n_trials=9,
     alphas =([0.35] * 3) + ([0.37] * 3) + ([0.39] * 3),
-    color_modes=[random.choice(["red", "green"]) for _i in range(9)],
+    color_modes=draw_color_modes(exp.session_seed, "adaptation_low", ["red", "green"], 9),
     detection_collection = False,
     discrimination_collection = False,
     forced_termination_buttons=["left", "right"],
@@ -101,7 +111,7 @@ exp.run_experimental_block(
 #     block_code="adaptation_final_samecolor",
 #     n_trials=10,
 #     alphas = alphas_for_demo,
-#     color_modes=[random.choice(["red", "green"]) for _i in range(10)],
+#     color_modes=draw_color_modes(exp.session_seed, "adaptation_final_samecolor", ["red", "green"], 10),
 #     detection_collection = True,
 #     discrimination_collection = True,
 #     forced_termination_buttons=["left", "right"],
@@ -126,7 +136,7 @@ exp.run_experimental_block(
 exp.display_text("Asjustment\nInstructions", text_mode="fusion", termination_buttons=["space", "enter"])
 exp.display_text("Ready?", text_mode="fusion", termination_buttons=["space", "enter"])
 suggested_alpha = exp.run_adjustment_block(block_code="adjustment", adjustment_buttons=["down", "up"])
-print("Suggested alpha", suggested_alpha)
+session_log.info("suggested_alpha", alpha=suggested_alpha)
 exp.display_text("Staircase\nInstructions", text_mode="fusion", termination_buttons=["space", "enter"])
 exp.display_text("Ready?", text_mode="fusion", termination_buttons=["space", "enter"])
 threshold_alpha = exp.run_adapted_staircase(
@@ -136,7 +146,7 @@ threshold_alpha = exp.run_adapted_staircase(
     alpha_increment=1 / 255,
     exploration_range = 5/255
 )
-print("Found alpha threshold is", threshold_alpha)
+session_log.info("threshold_alpha", alpha=threshold_alpha)
 
 alpha_to_use = threshold_alpha + 0.05*threshold_alpha
 
@@ -150,7 +160,7 @@ exp.run_experimental_block(
     block_code=f"simple_block_same_color",
     n_trials=N,
     alphas = [alpha_to_use for _i in range(N)],
-    color_modes=[random.choice(["green", "red"]) for _i in range(N)],
+    color_modes=draw_color_modes(exp.session_seed, "simple_block_same_color", ["green", "red"], N),
     detection_collection = True,
     discrimination_collection = True,
     forced_termination_buttons=None,
@@ -204,6 +214,7 @@ for iblock in range(3):
     )
 
 exp.display_text("Fin", text_mode="fusion", termination_buttons=["space", "enter"])
+exp.finish()
 
 
 
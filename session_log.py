@@ -0,0 +1,155 @@
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+import atexit
+import json
+import os
+import threading
+import time
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+
+class Session_Log:
+    """
+    Structured event log that never blocks the caller on I/O.
+
+    `log` only appends (timestamp, level, event, fields) to an in-memory
+    ring buffer; a background thread drains it every `flush_interval`
+    seconds into a JSON-lines file (once `start` has set one) and echoes
+    events of at least `console_level` to stdout. Timestamps are seconds
+    on the session clock (perf_counter relative to the creation of the
+    log). If the buffer overflows, the oldest events are dropped and
+    counted.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 65536,
+        flush_interval: float = 0.1,
+        level: str = "DEBUG",
+        console_level: str = "INFO",
+    ):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.level = LEVELS[level]
+        self.console_level = LEVELS[console_level]
+        self.clock_start = time.perf_counter()
+        self.clock_start_wall = datetime.now().isoformat()
+        self.path = None
+        self.n_dropped = 0
+
+        self._buffer = deque(maxlen=capacity)
+        self._backlog = []  # drained before a file was set
+        self._file = None
+        self._lock = threading.Lock()  # held by the drain thread and close() only
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        # a forked render process inherits the log but not its thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._buffer = deque(maxlen=self.capacity)
+        self._backlog = []
+        self._file = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._drain_loop, daemon=True)
+        self._thread.start()
+
+    def start(self, path: Path):
+        """Writing the events (including the ones logged so far) to `path`"""
+        self._ensure_thread()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self.path = path
+            self._file = open(path, "a")
+            self._file.write(
+                json.dumps(
+                    {
+                        "t": 0.0,
+                        "level": "INFO",
+                        "event": "session_clock",
+                        "wall_time": self.clock_start_wall,
+                        "pid": os.getpid(),
+                    }
+                )
+                + "\n"
+            )
+            for line in self._backlog:
+                self._file.write(line)
+            self._backlog = []
+            self._file.flush()
+
+    def log(self, level: str, event: str, **fields):
+        level_value = LEVELS[level]
+        if level_value < self.level:
+            return
+        if self._pid != os.getpid():
+            self._ensure_thread()
+        if len(self._buffer) == self.capacity:
+            self.n_dropped += 1
+        self._buffer.append(
+            (time.perf_counter() - self.clock_start, level, level_value, event, fields)
+        )
+        if self._thread is None:
+            self._drain()  # after close
+
+    def debug(self, event: str, **fields):
+        self.log("DEBUG", event, **fields)
+
+    def info(self, event: str, **fields):
+        self.log("INFO", event, **fields)
+
+    def warning(self, event: str, **fields):
+        self.log("WARNING", event, **fields)
+
+    def error(self, event: str, **fields):
+        self.log("ERROR", event, **fields)
+
+    def _drain(self):
+        with self._lock:
+            lines = []
+            while len(self._buffer) > 0:
+                timestamp, level, level_value, event, fields = self._buffer.popleft()
+                lines.append(
+                    json.dumps(
+                        {"t": timestamp, "level": level, "event": event, **fields},
+                        default=str,
+                    )
+                    + "\n"
+                )
+                if level_value >= self.console_level:
+                    details = " ".join(f"{key}={value}" for key, value in fields.items())
+                    print(f"[{timestamp:9.3f}] {level} {event} {details}".rstrip())
+            if self._file is None:
+                self._backlog.extend(lines)
+            elif len(lines) > 0:
+                self._file.writelines(lines)
+                self._file.flush()
+
+    def _drain_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self._drain()
+
+    def close(self):
+        """Stopping the drain thread after writing the remaining events"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self.n_dropped > 0:
+            self.warning("events_dropped", n_dropped=self.n_dropped)
+        self._drain()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+session_log = Session_Log()
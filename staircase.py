@@ -0,0 +1,255 @@
+from collections import deque
+from pathlib import Path
+import random
+import json
+
+import numpy as np
+
+
+class Staircase:
+    """
+    Incremental up/down staircase.
+
+    A `True` response counts towards an increase of the tracked value,
+    a `False` response towards a decrease. The value is increased by
+    `increment` after `n_increase` consecutive `True` responses and decreased
+    by `decrement` after `n_decrease` consecutive `False` responses, which
+    covers simple (1/1), transformed (e.g. 1/2) and weighted
+    (increment != decrement) rules.
+
+    Direction, reversals and the convergence window are updated in O(1)
+    per response; the staircase never rescans its history.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        start_value: float,
+        increment: float,
+        decrement: float,
+        n_reversals: int,
+        n_increase: int = 1,
+        n_decrease: int = 1,
+        min_value: float = -np.inf,
+        max_value: float = np.inf,
+    ):
+        if n_reversals < 1:
+            raise ValueError("Number of reversals should be a positive integer")
+        if n_increase < 1 or n_decrease < 1:
+            raise ValueError("Transformed rule counts should be positive integers")
+
+        self.name = name
+        self.increment = increment
+        self.decrement = decrement
+        self.n_reversals = n_reversals
+        self.n_increase = n_increase
+        self.n_decrease = n_decrease
+        self.min_value = min_value
+        self.max_value = max_value
+
+        self.value = start_value
+        self.n_trials = 0
+        self.direction = 0  # +1 last step up, -1 last step down, 0 no step yet
+        self.reversals_found = 0
+        self.last_reversal_value = None
+        self._increase_run = 0
+        self._decrease_run = 0
+        self._window = deque([start_value], maxlen=n_reversals)
+        self._window_sum = start_value
+        self._n_values = 1
+
+    @property
+    def is_converged(self) -> bool:
+        return (self.reversals_found >= self.n_reversals) and (
+            self._n_values > self.n_reversals
+        )
+
+    @property
+    def convergence(self) -> float | None:
+        """Mean of the last `n_reversals` values once converged, else None"""
+        if not self.is_converged:
+            return None
+        return self._window_sum / len(self._window)
+
+    def peek(self, response: bool) -> float:
+        """The value `update(response)` would return, without changing the state"""
+        if response:
+            if self._increase_run + 1 < self.n_increase:
+                return self.value
+            return min(self.value + self.increment, self.max_value)
+        if self._decrease_run + 1 < self.n_decrease:
+            return self.value
+        return max(self.value - self.decrement, self.min_value)
+
+    def update(self, response: bool) -> float:
+        self.n_trials += 1
+        step = 0
+        if response:
+            self._increase_run += 1
+            self._decrease_run = 0
+            if self._increase_run >= self.n_increase:
+                self._increase_run = 0
+                step = 1
+        else:
+            self._decrease_run += 1
+            self._increase_run = 0
+            if self._decrease_run >= self.n_decrease:
+                self._decrease_run = 0
+                step = -1
+
+        if step == 0:
+            return self.value
+
+        if step == 1:
+            value = min(self.value + self.increment, self.max_value)
+        else:
+            value = max(self.value - self.decrement, self.min_value)
+
+        if self.direction != 0 and step != self.direction:
+            self.reversals_found += 1
+            self.last_reversal_value = self.value
+        self.direction = step
+
+        if len(self._window) == self._window.maxlen:
+            self._window_sum -= self._window[0]
+        self._window.append(value)
+        self._window_sum += value
+        self._n_values += 1
+
+        self.value = value
+        return value
+
+    def get_state(self) -> dict:
+        return {
+            "name": self.name,
+            "increment": self.increment,
+            "decrement": self.decrement,
+            "n_reversals": self.n_reversals,
+            "n_increase": self.n_increase,
+            "n_decrease": self.n_decrease,
+            "min_value": None if np.isinf(self.min_value) else self.min_value,
+            "max_value": None if np.isinf(self.max_value) else self.max_value,
+            "value": self.value,
+            "n_trials": self.n_trials,
+            "direction": self.direction,
+            "reversals_found": self.reversals_found,
+            "last_reversal_value": self.last_reversal_value,
+            "increase_run": self._increase_run,
+            "decrease_run": self._decrease_run,
+            "window": list(self._window),
+            "n_values": self._n_values,
+            "convergence": self.convergence,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict):
+        staircase = cls(
+            name=state["name"],
+            start_value=state["value"],
+            increment=state["increment"],
+            decrement=state["decrement"],
+            n_reversals=state["n_reversals"],
+            n_increase=state["n_increase"],
+            n_decrease=state["n_decrease"],
+            min_value=-np.inf if state["min_value"] is None else state["min_value"],
+            max_value=np.inf if state["max_value"] is None else state["max_value"],
+        )
+        staircase.n_trials = state["n_trials"]
+        staircase.direction = state["direction"]
+        staircase.reversals_found = state["reversals_found"]
+        staircase.last_reversal_value = state["last_reversal_value"]
+        staircase._increase_run = state["increase_run"]
+        staircase._decrease_run = state["decrease_run"]
+        staircase._window = deque(state["window"], maxlen=state["n_reversals"])
+        staircase._window_sum = sum(staircase._window)
+        staircase._n_values = state["n_values"]
+        return staircase
+
+
+class Interleaved_Staircase:
+    """
+    N randomly interleaved staircases (e.g. Swiss/Dutch, per color mode or
+    per eye). Converged once every staircase has converged; the threshold
+    is the mean of the individual convergence values.
+    If `state_file` is given, the state is written to disk after every update.
+    """
+
+    def __init__(self, staircases: list, state_file: Path | None = None):
+        if len(staircases) == 0:
+            raise ValueError("At least one staircase is required")
+        self.staircases = {staircase.name: staircase for staircase in staircases}
+        if len(self.staircases) != len(staircases):
+            raise ValueError("Staircase names should be unique")
+        self.state_file = state_file
+        self._n_converged = sum(
+            staircase.is_converged for staircase in self.staircases.values()
+        )
+
+    def choose(self) -> str:
+        return random.choice(list(self.staircases.keys()))
+
+    def __getitem__(self, name: str) -> Staircase:
+        return self.staircases[name]
+
+    @property
+    def is_converged(self) -> bool:
+        return self._n_converged == len(self.staircases)
+
+    @property
+    def convergence(self) -> float | None:
+        if not self.is_converged:
+            return None
+        return float(
+            np.mean(
+                [staircase.convergence for staircase in self.staircases.values()]
+            )
+        )
+
+    def get_values(self) -> list:
+        return [staircase.value for staircase in self.staircases.values()]
+
+    def get_next_values(self, name: str) -> list:
+        """All values that can be presented after the next response on `name`"""
+        next_values = [
+            staircase.value
+            for other_name, staircase in self.staircases.items()
+            if other_name != name
+        ]
+        next_values += [self.staircases[name].peek(response) for response in [True, False]]
+        return next_values
+
+    def update(self, name: str, response: bool) -> float:
+        staircase = self.staircases[name]
+        was_converged = staircase.is_converged
+        value = staircase.update(response)
+        if staircase.is_converged and not was_converged:
+            self._n_converged += 1
+
+        if self.state_file is not None:
+            self.save_state()
+        return value
+
+    def save_state(self):
+        Path(self.state_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_file, "w") as f:
+            json.dump(
+                {
+                    "staircases": [
+                        staircase.get_state()
+                        for staircase in self.staircases.values()
+                    ],
+                    "convergence": self.convergence,
+                },
+                f,
+                indent=4,
+            )
+
+    @classmethod
+    def load_state(cls, state_file: Path):
+        with open(state_file, "r") as f:
+            state = json.load(f)
+        staircases = [
+            Staircase.from_state(staircase_state)
+            for staircase_state in state["staircases"]
+        ]
+        return cls(staircases=staircases, state_file=state_file)
@@ -0,0 +1,164 @@
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+
+def simulate_adapted_staircase(
+    n_reversals: int,
+    alpha_increment: float,
+    exploration_range: float,
+    n_observers: int = 5000,
+    gamma: float = 0.4,
+    true_threshold: float = 0.3,
+    slope: float = 100,
+    false_alarm_rate: float = 0.0,
+    lapse_rate: float = 0.0,
+    suggestion_sd: float = 5 / 255,
+    max_trials: int = 500,
+    rng: np.random.Generator | None = None,
+) -> dict:
+    """
+    Monte Carlo simulation of Experiment.run_adapted_staircase for
+    `n_observers` simulated observers at once.
+
+    Follows the same logic as the Swiss/Dutch Interleaved_Staircase:
+    the staircase for every trial is chosen at random, "yes" increases
+    alpha and "no" decreases it by `alpha_increment` (clipped to [0, gamma]),
+    and the block ends once both staircases have `n_reversals` reversals;
+    the threshold is the mean of their last `n_reversals` values.
+
+    Observers report "yes" with probability
+    fa + (1 - fa - lapse) / (1 + exp(slope * (alpha - true_threshold)))
+    and start from a suggested alpha drawn around the true threshold
+    with SD `suggestion_sd` (the error of the adjustment block).
+    Observers that do not converge within `max_trials` are counted as failures.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    n_staircases = 2
+    observers = np.arange(n_observers)
+
+    suggested_alpha = true_threshold + rng.normal(0, suggestion_sd, n_observers)
+    values = np.stack(
+        [
+            suggested_alpha + exploration_range / 2,
+            suggested_alpha - exploration_range / 2,
+        ],
+        axis=1,
+    )
+    direction = np.zeros((n_observers, n_staircases), dtype=np.int8)
+    reversals = np.zeros((n_observers, n_staircases), dtype=np.int64)
+    n_values = np.ones((n_observers, n_staircases), dtype=np.int64)
+    window = np.zeros((n_observers, n_staircases, n_reversals))
+    window[:, :, 0] = values
+
+    n_trials = np.zeros(n_observers, dtype=np.int64)
+    is_active = np.ones(n_observers, dtype=bool)
+
+    for _itrial in range(max_trials):
+        active = observers[is_active]
+        if len(active) == 0:
+            break
+
+        staircase = rng.integers(0, n_staircases, len(active))
+        alpha = values[active, staircase]
+        p_yes = false_alarm_rate + (1 - false_alarm_rate - lapse_rate) / (
+            1 + np.exp(np.clip(slope * (alpha - true_threshold), -50, 50))
+        )
+        step = np.where(rng.random(len(active)) < p_yes, 1, -1).astype(np.int8)
+        alpha_updated = np.clip(alpha + step * alpha_increment, 0, gamma)
+
+        previous_direction = direction[active, staircase]
+        reversals[active, staircase] += (previous_direction != 0) & (
+            previous_direction != step
+        )
+        direction[active, staircase] = step
+        window[active, staircase, n_values[active, staircase] % n_reversals] = (
+            alpha_updated
+        )
+        n_values[active, staircase] += 1
+        values[active, staircase] = alpha_updated
+        n_trials[active] += 1
+
+        is_converged = np.all(
+            (reversals[active] >= n_reversals) & (n_values[active] > n_reversals),
+            axis=1,
+        )
+        is_active[active[is_converged]] = False
+
+    thresholds = window.mean(axis=(1, 2))
+    thresholds[is_active] = np.nan
+
+    sigmoid_at_half = (0.5 - false_alarm_rate) / (1 - false_alarm_rate - lapse_rate)
+    alpha_50 = true_threshold + np.log(1 / sigmoid_at_half - 1) / slope
+
+    converged = ~is_active
+    return {
+        "n_reversals": n_reversals,
+        "alpha_increment": alpha_increment,
+        "exploration_range": exploration_range,
+        "expected_trials": float(n_trials[converged].mean()) if converged.any() else np.nan,
+        "trials_95th_percentile": (
+            float(np.percentile(n_trials[converged], 95)) if converged.any() else np.nan
+        ),
+        "bias": float(np.nanmean(thresholds) - alpha_50),
+        "variance": float(np.nanvar(thresholds)),
+        "sd": float(np.nanstd(thresholds)),
+        "rmse": float(np.sqrt(np.nanmean((thresholds - alpha_50) ** 2))),
+        "failure_rate": float(is_active.mean()),
+    }
+
+
+def tune_staircase_parameters(
+    n_reversals_grid: list,
+    alpha_increment_grid: list,
+    exploration_range_grid: list,
+    seed: int | None = None,
+    **simulation_kwargs,
+) -> pd.DataFrame:
+    """
+    Simulating every combination of the staircase settings.
+    Additional keyword arguments are passed to simulate_adapted_staircase.
+    """
+    rng = np.random.default_rng(seed)
+    results = [
+        simulate_adapted_staircase(
+            n_reversals=n_reversals,
+            alpha_increment=alpha_increment,
+            exploration_range=exploration_range,
+            rng=rng,
+            **simulation_kwargs,
+        )
+        for n_reversals, alpha_increment, exploration_range in product(
+            n_reversals_grid, alpha_increment_grid, exploration_range_grid
+        )
+    ]
+    return pd.DataFrame.from_records(results)
+
+
+def select_cheapest_configuration(
+    results: pd.DataFrame, target_rmse: float, max_failure_rate: float = 0.01
+) -> pd.Series | None:
+    """
+    The configuration with the lowest expected trial count among those
+    reaching the target precision (RMSE of the returned threshold).
+    """
+    eligible = results[
+        (results["rmse"] <= target_rmse) & (results["failure_rate"] <= max_failure_rate)
+    ]
+    if len(eligible) == 0:
+        return None
+    return eligible.sort_values("expected_trials").iloc[0]
+
+
+if __name__ == "__main__":
+    tuning_results = tune_staircase_parameters(
+        n_reversals_grid=[3, 5, 7, 9],
+        alpha_increment_grid=[1 / 255, 2 / 255, 3 / 255],
+        exploration_range_grid=[0, 5 / 255, 10 / 255],
+        seed=2025,
+    )
+    print(tuning_results.to_string())
+    print(select_cheapest_configuration(tuning_results, target_rmse=3 / 255))
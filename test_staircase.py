@@ -0,0 +1,91 @@
+import pytest
+
+from staircase import Staircase, Interleaved_Staircase
+
+
+def get_staircase(**kwargs) -> Staircase:
+    settings = dict(
+        name="test", start_value=0.5, increment=0.1, decrement=0.1, n_reversals=2
+    )
+    settings.update(kwargs)
+    return Staircase(**settings)
+
+
+def test_reversals_are_counted_on_direction_changes():
+    staircase = get_staircase()
+    values = [staircase.update(response) for response in [True, True, False, True, False]]
+
+    assert values == pytest.approx([0.6, 0.7, 0.6, 0.7, 0.6])
+    assert staircase.reversals_found == 3
+    assert staircase.last_reversal_value == pytest.approx(0.7)
+
+
+def test_responses_without_a_step_are_no_reversals():
+    staircase = get_staircase(n_decrease=2)
+    staircase.update(True)
+    staircase.update(False)
+
+    assert staircase.value == pytest.approx(0.6)
+    assert staircase.reversals_found == 0
+
+    staircase.update(False)
+    assert staircase.value == pytest.approx(0.5)
+    assert staircase.reversals_found == 1
+
+
+def test_convergence_is_the_mean_of_the_last_values():
+    staircase = get_staircase(n_reversals=2)
+    staircase.update(True)
+    staircase.update(False)
+    assert not staircase.is_converged
+    assert staircase.convergence is None
+
+    staircase.update(True)
+    assert staircase.is_converged
+    # the window holds the last n_reversals values: 0.5, 0.6
+    assert staircase.convergence == pytest.approx(0.55)
+
+    staircase.update(True)
+    assert staircase.convergence == pytest.approx(0.65)
+
+
+def test_interleaved_convergence_waits_for_every_staircase():
+    staircases = Interleaved_Staircase(
+        staircases=[get_staircase(name="A"), get_staircase(name="B", start_value=0.3)]
+    )
+    for response in [True, False, True]:
+        staircases.update(name="A", response=response)
+    assert staircases["A"].is_converged
+    assert not staircases.is_converged
+
+    for response in [False, True, False]:
+        staircases.update(name="B", response=response)
+    assert staircases.is_converged
+    assert staircases.convergence == pytest.approx(
+        (staircases["A"].convergence + staircases["B"].convergence) / 2
+    )
+
+
+def test_state_round_trip(tmp_path):
+    state_file = tmp_path / "staircase_state.json"
+    staircases = Interleaved_Staircase(
+        staircases=[
+            get_staircase(name="A", n_decrease=2, min_value=0),
+            get_staircase(name="B", start_value=0.3, n_reversals=3),
+        ],
+        state_file=state_file,
+    )
+    for name, response in [("A", True), ("B", False), ("A", False), ("B", True), ("A", True)]:
+        staircases.update(name=name, response=response)
+
+    loaded = Interleaved_Staircase.load_state(state_file)
+    for name in ["A", "B"]:
+        assert loaded[name].get_state() == staircases[name].get_state()
+
+    # both continue identically, including the pending transformed-rule run
+    for name, response in [("A", False), ("A", False), ("B", False), ("B", True)]:
+        assert loaded.update(name=name, response=response) == pytest.approx(
+            staircases.update(name=name, response=response)
+        )
+    assert loaded.get_values() == pytest.approx(staircases.get_values())
+    assert loaded.is_converged == staircases.is_converged
@@ -0,0 +1,241 @@
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+import json
+import time
+
+import numpy as np
+from psychopy import visual, event
+
+from draw_list import Draw_Metrics
+
+
+@dataclass
+class Epoch:
+    """
+    Consecutive frames of a block timeline.
+
+    frames: draw list of every frame; None for an open-ended epoch that
+        repeats `draw_list` until one of `termination_buttons` is pressed
+    termination_buttons: keys ending the epoch early (or at all if open-ended)
+    termination_frame: draw list shown once after a termination key
+    on_start: called right before the first frame is drawn
+    on_flip: called with the frame index right after every flip
+    on_end: called with (key or None, number of frames shown) when the epoch ends
+    is_critical: stimulus epoch protected by the real-time mode
+    """
+
+    name: str
+    frames: list | None = None
+    draw_list: list = field(default_factory=list)
+    termination_buttons: list | None = None
+    termination_frame: list | None = None
+    on_start: object = None
+    on_flip: object = None
+    on_end: object = None
+    is_critical: bool = False
+
+    def __post_init__(self):
+        if self.frames is None and not self.termination_buttons:
+            raise ValueError("An open-ended epoch needs termination buttons")
+
+
+class Block_Timeline:
+    """
+    One continuous, frame-locked timeline for a whole block.
+
+    Epochs (trial, response screens, ITI) follow each other on frame
+    boundaries, with exactly one flip per frame. Bookkeeping (building the
+    next trial, saving data) is deferred as tasks that run right after a
+    flip while less than `budget_fraction` of the frame has elapsed, and
+    never during critical (stimulus) epochs: tasks deferred there wait for
+    the following response, ITI or filler frames. If the epoch queue runs
+    empty while tasks are pending, `filler` frames (the dichoptic canvas)
+    are shown instead of holding the last frame.
+    Every epoch, flip time and task is logged, as well as the draw calls
+    and draw time of every frame (see draw_list.py).
+    With a `real_time_mode` (see realtime.py), critical epochs run with
+    garbage collection deferred and raised priority, and the deferred
+    collections run at the start of the other epochs.
+    """
+
+    def __init__(
+        self,
+        window: visual.Window,
+        frame_duration: float,
+        filler: list,
+        budget_fraction: float = 0.5,
+        real_time_mode=None,
+    ):
+        self.window = window
+        self.real_time_mode = real_time_mode
+        self.frame_duration = frame_duration
+        self.filler = filler
+        self.budget_fraction = budget_fraction
+
+        self._epochs = deque()
+        self._tasks = deque()
+        self.flip_times = []
+        self.epoch_log = []
+        self.task_log = []
+        self.draw_metrics = Draw_Metrics()
+        self._last_flip = None
+        self._is_critical = False
+
+    def append(self, epoch: Epoch):
+        self._epochs.append(epoch)
+
+    def defer(self, task, name: str):
+        self._tasks.append((task, name))
+
+    def _flip(self):
+        self.window.flip()
+        self._last_flip = time.perf_counter()
+        self.flip_times.append(self._last_flip)
+
+    def _run_tasks(self, force: bool = False):
+        """
+        Running deferred tasks while the frame budget allows (at least one
+        if forced); nothing runs during a critical epoch
+        """
+        if self._is_critical:
+            return
+        budget = self.budget_fraction * self.frame_duration
+        while len(self._tasks) > 0:
+            elapsed = time.perf_counter() - self._last_flip
+            if elapsed >= budget and not force:
+                break
+            task, name = self._tasks.popleft()
+            start = time.perf_counter()
+            task()
+            duration = time.perf_counter() - start
+            self.task_log.append(
+                {
+                    "task": name,
+                    "frame": len(self.flip_times),
+                    "duration__s": duration,
+                    "is_over_budget": elapsed + duration > budget,
+                }
+            )
+            force = False
+
+    def _set_critical(self, is_critical: bool):
+        self._is_critical = is_critical
+        if self.real_time_mode is None:
+            return
+        if is_critical:
+            self.real_time_mode.enter_critical()
+        elif self.real_time_mode.is_critical:
+            self.real_time_mode.leave_critical()
+            self.defer(self.real_time_mode.housekeeping, name="housekeeping")
+
+    def _run_epoch(self, epoch: Epoch):
+        self._set_critical(epoch.is_critical)
+        if epoch.on_start is not None:
+            epoch.on_start()
+        if epoch.termination_buttons:
+            event.clearEvents(eventType="keyboard")
+
+        first_frame = len(self.flip_times)
+        key = None
+        iframe = 0
+        while epoch.frames is None or iframe < len(epoch.frames):
+            draw_list = epoch.draw_list if epoch.frames is None else epoch.frames[iframe]
+            self.draw_metrics.draw(draw_list)
+            self._flip()
+            if epoch.on_flip is not None:
+                epoch.on_flip(iframe)
+            iframe += 1
+
+            if epoch.termination_buttons:
+                keys_pressed = event.getKeys()
+                if any(button in keys_pressed for button in epoch.termination_buttons):
+                    key = keys_pressed[0]
+                    break
+            self._run_tasks()
+
+        n_frames = iframe
+        if key is not None and epoch.termination_frame is not None:
+            self.draw_metrics.draw(epoch.termination_frame)
+            self._flip()
+            self._run_tasks()
+
+        self.epoch_log.append(
+            {
+                "epoch": epoch.name,
+                "first_frame": first_frame,
+                "n_frames": len(self.flip_times) - first_frame,
+                "planned_frames": None if epoch.frames is None else len(epoch.frames),
+                "terminated_by": key,
+            }
+        )
+        if epoch.on_end is not None:
+            epoch.on_end(key, n_frames)
+
+    def run(self):
+        """Running until no epochs and no tasks are left"""
+        if self._last_flip is None:
+            self.draw_metrics.draw(self.filler)
+            self._flip()
+        while len(self._epochs) > 0 or len(self._tasks) > 0:
+            if len(self._epochs) > 0:
+                self._run_epoch(self._epochs.popleft())
+                continue
+            # nothing ready to show: running the pending tasks behind filler frames
+            self._set_critical(False)
+            first_frame = len(self.flip_times)
+            while len(self._epochs) == 0 and len(self._tasks) > 0:
+                self.draw_metrics.draw(self.filler)
+                self._flip()
+                self._run_tasks(force=True)
+            self.epoch_log.append(
+                {
+                    "epoch": "filler",
+                    "first_frame": first_frame,
+                    "n_frames": len(self.flip_times) - first_frame,
+                    "planned_frames": 0,
+                    "terminated_by": None,
+                }
+            )
+        self._set_critical(False)
+        while len(self._tasks) > 0:
+            self._run_tasks(force=True)
+
+    def get_summary(self) -> dict:
+        intervals = np.diff(self.flip_times)
+        dropped = intervals > 1.5 * self.frame_duration
+        return {
+            "n_frames": len(self.flip_times),
+            "frame_duration__s": self.frame_duration,
+            "mean_interval__s": float(intervals.mean()) if len(intervals) > 0 else None,
+            "max_interval__s": float(intervals.max()) if len(intervals) > 0 else None,
+            "n_dropped_frames": int(dropped.sum()),
+            "dropped_at_frames": (np.flatnonzero(dropped) + 1).tolist(),
+            "n_filler_frames": sum(
+                entry["n_frames"] for entry in self.epoch_log if entry["epoch"] == "filler"
+            ),
+            "n_tasks_over_budget": sum(entry["is_over_budget"] for entry in self.task_log),
+            "draw": self.draw_metrics.get_summary(),
+        }
+
+    def get_log(self) -> dict:
+        flip_times = np.asarray(self.flip_times)
+        return {
+            "summary": self.get_summary(),
+            "epochs": self.epoch_log,
+            "tasks": self.task_log,
+            "flip_times__s": (flip_times - flip_times[0]).tolist()
+            if len(flip_times) > 0
+            else [],
+            "draw_calls": self.draw_metrics.draw_calls,
+            "draw_times__s": self.draw_metrics.draw_times,
+        }
+
+    def save_log(self, path: Path):
+        save_timeline_log(self.get_log(), path)
+
+
+def save_timeline_log(log: dict, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(log, f, indent=4)
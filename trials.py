@@ -2,7 +2,9 @@ import random
 from abc import ABC, abstractmethod
 from pathlib import Path
 import json
+import time
 from copy import copy
+from concurrent.futures import ThreadPoolExecutor
 
 from psychopy import visual, colors, event
 import pandas as pd
@@ -10,6 +12,10 @@ import numpy as np
 from PIL import Image
 
 from image_processing import prepare_image
+from misc import Parameters, Color_Table, Held_Key_Accelerator
+from timeline import Epoch
+from idle import Idle_Screen
+from draw_list import Draw_List
 
 
 class Dichoptic_Trial(ABC):
@@ -34,6 +40,7 @@ class Dichoptic_Trial(ABC):
         detection_judgement_routine: dict | None,
         discrimination_judgement_routine: dict | None,
         termination_buttons: list | None,
+        dichoptic_canvas: list | None = None,
     ):
         """
         Parameters
@@ -42,6 +49,9 @@ class Dichoptic_Trial(ABC):
             Window to display the stimuli
         data_folder: Path
             Folder to save the data generated in the trial
+        dichoptic_canvas: list | None
+            Frames and fixation crosses shared between trials
+            (see Trial_Factory); generated for the trial if None
 
         """
         self.index = index
@@ -58,14 +68,17 @@ class Dichoptic_Trial(ABC):
 
         self.stimuli = []
         self.supporting_visuals = []
-        self.dichoptic_canvas = generate_dichoptic_canvas(
-            window=window,
-            inter_square_distance=inter_square_distance,
-            square_size=square_size,
-            frame_color=frame_color,
-            frame_thickness=frame_thickness,
-            fixation_cross_size=fixation_cross_size,
-        )
+        self._draw_lists = None
+        if dichoptic_canvas is None:
+            dichoptic_canvas = generate_dichoptic_canvas(
+                window=window,
+                inter_square_distance=inter_square_distance,
+                square_size=square_size,
+                frame_color=frame_color,
+                frame_thickness=frame_thickness,
+                fixation_cross_size=fixation_cross_size,
+            )
+        self.dichoptic_canvas = dichoptic_canvas
 
         self.detection_report = None
         if detection_judgement_routine is not None:
@@ -83,62 +96,146 @@ class Dichoptic_Trial(ABC):
         self.info["trial_id"] = index
         self.info["terminated_by"] = "time_out"
 
-    def run(self, hide_stimulus: bool = False):
-        event.clearEvents(eventType="keyboard")
-
-        frame_mapping = {iframe: None for iframe in range(self.max_trial_duration)}
+    def _compile_draw_lists(self) -> dict:
+        stimulus_on = Draw_List(
+            "stimulus_on", self.supporting_visuals, self.stimuli, self.dichoptic_canvas
+        )
+        return {
+            "stimulus_on": stimulus_on,
+            "stimulus_off": stimulus_on.variant("stimulus_off", exclude=self.stimuli),
+            # the canvas without its fixation crosses
+            "termination": Draw_List(
+                "termination",
+                self.supporting_visuals,
+                self.stimuli,
+                [obj for iobj, obj in enumerate(self.dichoptic_canvas) if iobj % 2 == 0],
+            ),
+        }
 
-        if not hide_stimulus:
-            self.info["stimulus_type"] = "gabor"
-            # inserting stimuli to canvas for the relevant frames
-            frame_visual_stimuli_off = self.supporting_visuals + self.dichoptic_canvas
-            frame_visual_stimuli_on = (
-                self.supporting_visuals + self.stimuli + self.dichoptic_canvas
-            )
+    def get_draw_lists(self) -> dict:
+        """Draw lists of the trial epochs, compiled once the stimuli are processed"""
+        if self._draw_lists is None:
+            self._draw_lists = self._compile_draw_lists()
+        return self._draw_lists
+
+    def get_frames(self, hide_stimulus: bool = False) -> list:
+        """Draw list of every frame of the trial"""
+        draw_lists = self.get_draw_lists()
+        frame_visual_stimuli_off = draw_lists["stimulus_off"]
+        if hide_stimulus:
+            self.info["stimulus_type"] = "empty"
+            return [frame_visual_stimuli_off] * self.max_trial_duration
+
+        self.info["stimulus_type"] = "gabor"
+        # inserting stimuli to canvas for the relevant frames
+        frame_visual_stimuli_on = draw_lists["stimulus_on"]
+        return [
+            frame_visual_stimuli_on
+            if (iframe > self.stimulus_onset)
+            and (iframe < (self.stimulus_onset + self.stimulus_duration))
+            else frame_visual_stimuli_off
+            for iframe in range(self.max_trial_duration)
+        ]
+
+    def get_termination_frame(self) -> Draw_List:
+        """Frame shown once after a termination button was pressed"""
+        return self.get_draw_lists()["termination"]
+
+    def _set_termination(self, key: str | None, last_frame: int):
+        if key is not None:
+            self.info["terminated_by"] = key
+        self.info["terminated_at"] = last_frame
 
-            for iframe in range(self.max_trial_duration):
-                # frame_visual_stimuli_on[-2:-2] = copy(self.stimuli)
-                if (iframe > self.stimulus_onset) and (
-                    iframe < (self.stimulus_onset + self.stimulus_duration)
-                ):
-                    frame_mapping[iframe] = frame_visual_stimuli_on
-                else:
-                    frame_mapping[iframe] = frame_visual_stimuli_off
+    def run(self, hide_stimulus: bool = False):
+        event.clearEvents(eventType="keyboard")
 
-        elif hide_stimulus:
-            self.info["stimulus_type"] = "empty"
-            frame_mapping = {
-                iframe: (self.supporting_visuals + self.dichoptic_canvas)
-                for iframe in range(self.max_trial_duration)
-            }
+        frames = self.get_frames(hide_stimulus=hide_stimulus)
 
-        last_frame = self.max_trial_duration
+        key = None
+        last_frame = len(frames)
         for iframe in range(last_frame):
-            for visual_object in frame_mapping[iframe]:
-                visual_object.draw()
+            frames[iframe].draw()
             self.window.flip()
+            self._on_flip(iframe)
 
             if self.termination_buttons is not None:
                 keys_pressed = event.getKeys()
                 if any([button in keys_pressed for button in self.termination_buttons]):
-                    self.info["terminated_by"] = keys_pressed[0]
+                    key = keys_pressed[0]
                     last_frame = iframe + 1
-                    frame_mapping[last_frame] = (
-                        self.supporting_visuals
-                        + self.stimuli
-                        + [
-                            obj
-                            for iobj, obj in enumerate(self.dichoptic_canvas)
-                            if iobj % 2 == 0
-                        ]
-                    )
-            if iframe == last_frame:
-                break
-        self.info["terminated_at"] = last_frame
+                    self.get_termination_frame().draw()
+                    self.window.flip()
+                    break
+        self._set_termination(key, last_frame)
+
+    def _on_flip(self, iframe: int):
+        """Called right after frame `iframe` of the trial was flipped"""
+        pass
+
+    def _get_pending_reports(self) -> list:
+        """(report name, response parameters) of the responses to collect after the trial"""
+        reports = []
+        if self.detection_report == "No_Report_Made":
+            reports.append(("detection", self.detection_params))
+        if self.discrimination_report == "No_Report_Made":
+            reports.append(("discrimination", self.discrimination_params))
+        return reports
+
+    def get_epochs(
+        self, hide_stimulus: bool = False, on_start=None, on_end=None
+    ) -> list:
+        """
+        The trial and its response screens as Block_Timeline epochs;
+        `on_end` is called once the last of them has ended.
+        """
+        epochs = [
+            Epoch(
+                name=f"{self.index}_trial",
+                frames=self.get_frames(hide_stimulus=hide_stimulus),
+                termination_buttons=self.termination_buttons,
+                termination_frame=self.get_termination_frame(),
+                on_start=on_start,
+                on_end=self._set_termination,
+                on_flip=self._on_flip,
+                is_critical=True,
+            )
+        ]
+
+        for report_name, response_params in self._get_pending_reports():
+            response_visuals, response_mapping = self._get_response_screen(
+                response_params
+            )
+
+            def store_response(key, _n_frames, report_name=report_name, mapping=response_mapping):
+                self.info[f"{report_name}_response_button_pressed"] = key
+                self.info[f"{report_name}_response"] = mapping[key]
+
+            epochs.append(
+                Epoch(
+                    name=f"{self.index}_{report_name}",
+                    draw_list=response_visuals,
+                    termination_buttons=list(response_params["response_buttons"]),
+                    on_end=store_response,
+                )
+            )
+
+        if on_end is not None:
+            last_on_end = epochs[-1].on_end
+
+            def end_trial(key, n_frames):
+                last_on_end(key, n_frames)
+                on_end()
+
+            epochs[-1].on_end = end_trial
+        return epochs
+
+    @property
+    def record_path(self) -> Path:
+        return self.data_folder / f"{self.index}.json"
 
     def save_data(self):
         self.data_folder.mkdir(exist_ok=True)
-        with open((self.data_folder / f"{self.index}.json"), "w") as f:
+        with open(self.record_path, "w") as f:
             json.dump(self.info, f, indent=4)
 
     def get_data(self):
@@ -176,6 +273,8 @@ class DCM_Trial(Dichoptic_Trial):
         gamma: float,
         alpha: float,
         beta_polynomial: np.poly1d,
+        color_table: Color_Table | None = None,
+        dichoptic_canvas: list | None = None,
     ):
         super().__init__(
             index,
@@ -193,6 +292,7 @@ class DCM_Trial(Dichoptic_Trial):
             detection_judgement_routine,
             discrimination_judgement_routine,
             termination_buttons,
+            dichoptic_canvas,
         )
 
         self.color_mode = color_mode
@@ -213,12 +313,17 @@ class DCM_Trial(Dichoptic_Trial):
                 "gamma and alpha parameters should be floats from 0 to 1 (alpha < gamma)"
             )
 
-        beta = beta_polynomial(alpha)
-        red_color = colors.Color(np.array([gamma, alpha, 0]), space="rgb1")
-        green_color = colors.Color(beta * np.array([alpha, gamma, 0]), space="rgb1")
-        self.colors = {"red": red_color, "green": green_color}
+        if color_table is not None:
+            # the displayed alpha is the one on the 8-bit grid
+            alpha = color_table.get_alpha(alpha)
+            beta = color_table.get_beta(alpha)
+            self.colors = color_table.get_colors(alpha)
+        else:
+            beta = beta_polynomial(alpha)
+            self.colors = get_dcm_colors(gamma=gamma, alpha=alpha, beta=beta)
 
         self.beta_polynomial = beta_polynomial
+        self.color_table = color_table
         self.alpha = alpha
         self.gamma = gamma
         self.info["color_mode"] = color_mode
@@ -227,13 +332,11 @@ class DCM_Trial(Dichoptic_Trial):
         self.info["beta"] = beta
         self.info["gamma"] = gamma
 
-    def _get_individual_response(
-        self, response_params: dict
-    ) -> tuple[str, str]:
+    def _get_response_screen(self, response_params: dict) -> tuple[list, dict]:
+        """Visuals of the response screen and the button to response mapping"""
         is_mapping_to_shuffle = response_params["is_mapping_to_shuffle__boolean"]
-        is_response_made = False
 
-        labels = copy(response_params["response_labels"])
+        labels = list(response_params["response_labels"])
         if is_mapping_to_shuffle is True:
             random.shuffle(labels)
         response_mapping = {
@@ -291,16 +394,17 @@ class DCM_Trial(Dichoptic_Trial):
             )
             response_visuals.append(mapping_visual_info)
 
-        for visual_object in self.dichoptic_canvas:
-            response_visuals.append(visual_object)
+        return (
+            Draw_List("response", response_visuals, self.dichoptic_canvas),
+            response_mapping,
+        )
 
-        # waiting for the button press
-        event.clearEvents(eventType="keyboard")
-        while is_response_made is False:
-            for visual_object in response_visuals:
-                visual_object.draw()
-            self.window.flip()
+    def _get_individual_response(
+        self, response_params: dict
+    ) -> tuple[str, str]:
+        response_visuals, response_mapping = self._get_response_screen(response_params)
 
+        def poll():
             keys_pressed = event.getKeys()
             if any(
                 [
@@ -308,13 +412,28 @@ class DCM_Trial(Dichoptic_Trial):
                     for button in response_params["response_buttons"]
                 ]
             ):
-                is_response_made = True
-                response_button_pressed = keys_pressed[0]
-                response = response_mapping[response_button_pressed]
+                return keys_pressed[0]
+            return None
+
+        # waiting for the button press
+        event.clearEvents(eventType="keyboard")
+        response_button_pressed = Idle_Screen(
+            window=self.window, name=f"response_{self.index}"
+        ).wait(draw_list=response_visuals, poll=poll)
+        response = response_mapping[response_button_pressed]
 
         return response_button_pressed, response
 
-    def process_stimuli(self):
+    def process_stimuli(
+        self, processed_images: dict | None = None, square_colors: dict | None = None
+    ):
+        """
+        processed_images: output of prepare_image for the colors and
+        orientation of this trial (e.g. from DCM_Stimulus_Prefetcher);
+        prepared here if None.
+        square_colors: color of the left and right square (e.g. from the
+        block plan); drawn from the color mode if None.
+        """
         SIDES = ["left", "right"]
 
         square_positions = {
@@ -322,23 +441,28 @@ class DCM_Trial(Dichoptic_Trial):
             "right": (int(self.inter_square_distance / 2 + self.square_size / 2), 0),
         }
 
-        square_colors = {side: None for side in SIDES}
-        if self.color_mode == "fusion":
-            color_set = ["red", "green"]
-            random.shuffle(color_set)
-            square_colors = {SIDES[i]: color_set[i] for i in range(len(SIDES))}
-        elif self.color_mode == "red":
-            square_colors = {side: "red" for side in SIDES}
-        elif self.color_mode == "green":
-            square_colors = {side: "green" for side in SIDES}
-
-        processed_images = prepare_image(
-            input_path=self.stimulus_source,
-            m=self.square_size,
-            red_rgb255=self.colors["red"].rgb255,
-            green_rgb255=self.colors["green"].rgb255,
-            ori=self.ori,
-        )
+        if square_colors is None:
+            square_colors = {side: None for side in SIDES}
+            if self.color_mode == "fusion":
+                color_set = ["red", "green"]
+                random.shuffle(color_set)
+                square_colors = {SIDES[i]: color_set[i] for i in range(len(SIDES))}
+            elif self.color_mode == "red":
+                square_colors = {side: "red" for side in SIDES}
+            elif self.color_mode == "green":
+                square_colors = {side: "green" for side in SIDES}
+        self.square_colors = square_colors
+        self.info["left_color"] = square_colors["left"]
+        self.info["right_color"] = square_colors["right"]
+
+        if processed_images is None:
+            processed_images = prepare_image(
+                input_path=self.stimulus_source,
+                m=self.square_size,
+                red_rgb255=self.colors["red"].rgb255,
+                green_rgb255=self.colors["green"].rgb255,
+                ori=self.ori,
+            )
 
         for side in SIDES:
             square_color = square_colors[side]
@@ -360,6 +484,7 @@ class DCM_Trial(Dichoptic_Trial):
                 pos=square_positions[side],
             )
             self.stimuli.append(image_stimulus)
+        self._draw_lists = None
 
     def collect_responses(self):
         if self.detection_report == "No_Report_Made":
@@ -400,6 +525,66 @@ class DCM_Trial(Dichoptic_Trial):
         )
         self.info["interval_response"] = interval_response
 
+class Two_Interval_DCM_Trial(DCM_Trial):
+    """
+    Two-interval forced choice trial. Both intervals and the gap between
+    them are one precompiled frame sequence built from the same prepared
+    stimuli; the stimulus is shown in `stimulus_interval` ("I" or "II").
+    The onsets of both intervals and all responses go into a single record.
+    """
+
+    def __init__(
+        self,
+        stimulus_interval: str,
+        inter_interval_duration: int,
+        interval_probe_params: dict,
+        **dcm_trial_kwargs,
+    ):
+        super().__init__(**dcm_trial_kwargs)
+        if stimulus_interval not in ["I", "II"]:
+            raise ValueError("stimulus interval can be either I or II")
+
+        self.stimulus_interval = stimulus_interval
+        self.inter_interval_duration = inter_interval_duration
+        self.interval_probe_params = interval_probe_params
+        self.interval_onset_frames = {
+            "I": 0,
+            "II": self.max_trial_duration + inter_interval_duration,
+        }
+        self.info["stimulus_interval"] = stimulus_interval
+        self.info["inter_interval_duration__frames"] = inter_interval_duration
+
+    def _compile_draw_lists(self) -> dict:
+        draw_lists = super()._compile_draw_lists()
+        draw_lists["gap"] = Draw_List("gap", self.dichoptic_canvas)
+        return draw_lists
+
+    def get_frames(self, hide_stimulus: bool = False) -> list:
+        stimulus_frames = super().get_frames(hide_stimulus=hide_stimulus)
+        draw_lists = self.get_draw_lists()
+        empty_frames = [draw_lists["stimulus_off"]] * len(stimulus_frames)
+        gap_frames = [draw_lists["gap"]] * self.inter_interval_duration
+        if self.stimulus_interval == "I":
+            return stimulus_frames + gap_frames + empty_frames
+        return empty_frames + gap_frames + stimulus_frames
+
+    def _on_flip(self, iframe: int):
+        for interval, onset_frame in self.interval_onset_frames.items():
+            if iframe == onset_frame:
+                self.info[f"interval_{interval}_onset__s"] = time.perf_counter()
+        if iframe == self.interval_onset_frames["II"]:
+            self.info["inter_interval_onset_difference__s"] = (
+                self.info["interval_II_onset__s"] - self.info["interval_I_onset__s"]
+            )
+
+    def _get_pending_reports(self) -> list:
+        return [("interval", self.interval_probe_params)] + super()._get_pending_reports()
+
+    def collect_responses(self):
+        self.collect_interval_response(interval_probe_params=self.interval_probe_params)
+        super().collect_responses()
+
+
 class Stereo_Trial(Dichoptic_Trial):
     def __init__(
         self,
@@ -415,6 +600,7 @@ class Stereo_Trial(Dichoptic_Trial):
         max_trial_duration: int,
         stimulus_source: list,
         termination_buttons: list,
+        dichoptic_canvas: list | None = None,
     ):
         super().__init__(
             index,
@@ -432,6 +618,7 @@ class Stereo_Trial(Dichoptic_Trial):
             stimulus_onset=0,
             detection_judgement_routine=False,
             discrimination_judgement_routine=False,
+            dichoptic_canvas=dichoptic_canvas,
         )
 
         if type(stimulus_source) != list:
@@ -486,19 +673,23 @@ class Inter_Trial_Interval:
         frame_color: colors.Color,
         frame_thickness: float,
         fixation_cross_size: int,
+        dichoptic_canvas: list | None = None,
     ):
         self.window = window
         self.index = index
         self.data_folder = data_folder
         self.duration = duration
-        self.dichoptic_canvas = generate_dichoptic_canvas(
-            window,
-            square_size,
-            inter_square_distance,
-            frame_color,
-            frame_thickness,
-            fixation_cross_size,
-        )
+        if dichoptic_canvas is None:
+            dichoptic_canvas = generate_dichoptic_canvas(
+                window,
+                square_size,
+                inter_square_distance,
+                frame_color,
+                frame_thickness,
+                fixation_cross_size,
+            )
+        self.dichoptic_canvas = dichoptic_canvas
+        self.draw_list = Draw_List("iti", dichoptic_canvas)
 
         self.info = {}
         self.info["preceding_trial"] = index
@@ -506,13 +697,24 @@ class Inter_Trial_Interval:
 
     def wait(self):
         for _iframe in range(self.duration):
-            for visual_object in self.dichoptic_canvas:
-                visual_object.draw()
+            self.draw_list.draw()
             self.window.flip()
 
+    def get_epoch(self, on_end=None) -> Epoch:
+        """The interval as a Block_Timeline epoch"""
+        return Epoch(
+            name=f"{self.index}_iti",
+            frames=[self.draw_list] * self.duration,
+            on_end=None if on_end is None else (lambda _key, _n_frames: on_end()),
+        )
+
+    @property
+    def record_path(self) -> Path:
+        return self.data_folder / f"post_{self.index}.json"
+
     def save_data(self):
         self.data_folder.mkdir(exist_ok=True)
-        with open((self.data_folder / f"post_{self.index}.json"), "w") as f:
+        with open(self.record_path, "w") as f:
             json.dump(self.info, f, indent=4)
 
 
@@ -561,6 +763,97 @@ def generate_dichoptic_canvas(
     return dichoptic_canvas
 
 
+def get_dcm_colors(gamma: float, alpha: float, beta: float) -> dict:
+    red_color = colors.Color(np.array([gamma, alpha, 0]), space="rgb1")
+    green_color = colors.Color(beta * np.array([alpha, gamma, 0]), space="rgb1")
+    return {"red": red_color, "green": green_color}
+
+
+class DCM_Stimulus_Prefetcher:
+    """
+    Speculative preparation of DCM stimulus images in background threads.
+
+    Candidate (alpha, ori) stimuli are submitted with `prefetch` while the
+    current trial is running, `get` returns the prepared images
+    (waiting for or computing them if needed), and `retain` discards the
+    candidates that can no longer be used once the response is known.
+    `wait` lets the pending preparations finish before a critical epoch.
+    Only PIL images are prepared off the main thread; psychopy objects are
+    still created by the trial on the render thread.
+    """
+
+    def __init__(
+        self,
+        stimulus_source: Path,
+        square_size: int,
+        gamma: float,
+        beta_polynomial: np.poly1d,
+        max_workers: int = 2,
+        color_table: Color_Table | None = None,
+    ):
+        self.stimulus_source = stimulus_source
+        self.square_size = square_size
+        self.gamma = gamma
+        self.beta_polynomial = beta_polynomial
+        self.color_table = color_table
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._cache = {}
+
+    @staticmethod
+    def _get_key(alpha: float, ori: int) -> tuple:
+        return (round(float(alpha), 9), ori)
+
+    def _prepare(self, alpha: float, ori: int) -> dict:
+        if self.color_table is not None:
+            stimulus_colors = self.color_table.get_colors(alpha)
+        else:
+            stimulus_colors = get_dcm_colors(
+                gamma=self.gamma, alpha=alpha, beta=self.beta_polynomial(alpha)
+            )
+        return prepare_image(
+            input_path=self.stimulus_source,
+            m=self.square_size,
+            red_rgb255=stimulus_colors["red"].rgb255,
+            green_rgb255=stimulus_colors["green"].rgb255,
+            ori=ori,
+        )
+
+    def prefetch(self, alphas: list, oris: list):
+        for alpha in alphas:
+            for ori in oris:
+                key = self._get_key(alpha, ori)
+                if key not in self._cache:
+                    self._cache[key] = self._executor.submit(self._prepare, alpha, ori)
+
+    def poll(self, alpha: float, ori: int) -> dict | None:
+        """Prepared images if they are ready, None otherwise (never waits)"""
+        future = self._cache.get(self._get_key(alpha, ori))
+        if future is None or not future.done():
+            return None
+        return future.result()
+
+    def get(self, alpha: float, ori: int) -> dict:
+        key = self._get_key(alpha, ori)
+        if key not in self._cache:
+            return self._prepare(alpha, ori)
+        return self._cache[key].result()
+
+    def wait(self):
+        for future in list(self._cache.values()):
+            if not future.cancelled():
+                future.exception()
+
+    def retain(self, alphas: list):
+        keys_to_keep = {self._get_key(alpha, 0)[0] for alpha in alphas}
+        for key in list(self._cache.keys()):
+            if key[0] not in keys_to_keep:
+                self._cache.pop(key).cancel()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._cache = {}
+
+
 class Dichoptic_Text(Dichoptic_Trial):
     def __init__(
         self,
@@ -737,35 +1030,38 @@ class Dichoptic_Slider(Dichoptic_Trial):
                 self.slider_duplicate = slider
 
     def run(self) -> float:
-        event.clearEvents(eventType="keyboard")
-        block_finish_called = False
-        while True:
-            for visual_object in self.stimuli + self.dichoptic_canvas:
-                visual_object.draw()
-
-                if self.slider_main.markerPos != self.slider_duplicate.markerPos:
-                    self.slider_duplicate.markerPos = self.slider_main.markerPos
-                self.slider_main.draw()
-                self.slider_duplicate.draw()
-
-            self.window.flip()
-
-            if self.termination_buttons is None:
-                raise ValueError("Dichoptic Slider termination buttons cannot be None")
+        if self.termination_buttons is None:
+            raise ValueError("Dichoptic Slider termination buttons cannot be None")
 
+        def poll():
             keys = event.getKeys()
             event.clearEvents()
             if len(keys) > 0:
                 key_pressed = keys[-1]
                 if key_pressed in self.termination_buttons:
-                    break
+                    return key_pressed
                 elif key_pressed in self.block_finish_buttons:
                     self.info["block_finish_called"] = "yes"
-                    break
+                    return key_pressed
                 elif key_pressed in self.increase_buttons:
                     self.slider_main.markerPos += 0.25
                 elif key_pressed in self.decrease_buttons:
                     self.slider_main.markerPos -= 0.25
+                self.slider_duplicate.markerPos = self.slider_main.markerPos
+            return None
+
+        # redrawn only when the marker moves
+        event.clearEvents(eventType="keyboard")
+        Idle_Screen(window=self.window, name=f"slider_{self.index}").wait(
+            draw_list=Draw_List(
+                "slider",
+                self.stimuli,
+                self.dichoptic_canvas,
+                [self.slider_main, self.slider_duplicate],
+            ),
+            poll=poll,
+            get_state=lambda: self.slider_main.markerPos,
+        )
 
         return self.slider_main.markerPos
 
@@ -773,6 +1069,12 @@ class Dichoptic_Slider(Dichoptic_Trial):
         pass
 
 class Adjustment_DCM_Trial(DCM_Trial):
+    """
+    Continuous adjustment of alpha. Requested alphas are coalesced to the
+    latest one, the corresponding images are prepared in a background
+    thread, and the new colors and images are swapped in at a frame
+    boundary once ready, so the frame loop never waits for image work.
+    """
 
     def _adjust_processed_stimuli(self, seed):
         self.supporting_visuals = []
@@ -781,16 +1083,38 @@ class Adjustment_DCM_Trial(DCM_Trial):
         self.process_stimuli()
 
     def _adjust_background_color(self, alpha, kappa_polynomial):
+        if self.color_table is not None:
+            self.window.setColor(self.color_table.get_background_color(alpha))
+            return
         kappa = kappa_polynomial(alpha)
         gamma = self.gamma
         background_color = colors.Color(kappa * np.array([gamma, gamma, gamma]), space="rgb1")
         self.window.setColor(background_color)
 
+    def _swap_stimuli(self, alpha, processed_images, kappa_polynomial):
+        """Updating colors and images of the existing stimuli in place"""
+        if self.color_table is not None:
+            alpha = self.color_table.get_alpha(alpha)
+            self.colors = self.color_table.get_colors(alpha)
+        else:
+            beta = self.beta_polynomial(alpha)
+            self.colors = get_dcm_colors(gamma=self.gamma, alpha=alpha, beta=beta)
+        self.alpha = alpha
+
+        for background_square, image_stimulus, side in zip(
+            self.supporting_visuals, self.stimuli, ["left", "right"]
+        ):
+            square_color = self.square_colors[side]
+            background_square.fillColor = self.colors[square_color]
+            image_stimulus.image = processed_images[square_color]
+        self._adjust_background_color(alpha = alpha, kappa_polynomial=kappa_polynomial)
 
     def run(self, adjustment_buttons: list, adjustment_value : int, kappa_polynomial) -> float:
         SEED = 2025
 
         self._adjust_processed_stimuli(seed = SEED)
+        # colors and images are swapped in place, so the lists stay valid
+        draw_lists = self.get_draw_lists()
         self._adjust_background_color(alpha = self.alpha, kappa_polynomial=kappa_polynomial)
         event.clearEvents(eventType="keyboard")
         if self.termination_buttons is None:
@@ -798,56 +1122,241 @@ class Adjustment_DCM_Trial(DCM_Trial):
         if type(adjustment_buttons) is not list or len(adjustment_buttons) != 2:
             raise ("adjustment buttons should be list of length 2")
 
+        accelerator = Held_Key_Accelerator(
+            window=self.window,
+            increase_keys=[adjustment_buttons[0]],
+            decrease_keys=[adjustment_buttons[1]],
+            step=adjustment_value,
+        )
+        prefetcher = DCM_Stimulus_Prefetcher(
+            stimulus_source=self.stimulus_source,
+            square_size=self.square_size,
+            gamma=self.gamma,
+            beta_polynomial=self.beta_polynomial,
+            max_workers=1,
+            color_table=self.color_table,
+        )
+
         last_frame = self.max_trial_duration
-        alpha = None
+        requested_alpha = self.alpha
+        displayed_alpha = self.alpha
         for iframe in range(last_frame):
 
             keys_pressed = event.getKeys()
             # termination check and routine
             if any([button in keys_pressed for button in self.termination_buttons]):
-                self.info["terminated_by"] = keys_pressed[0]
+                self.info["terminated_by"] = [
+                    key for key in keys_pressed if key in self.termination_buttons
+                ][0]
                 break
-            # adjustment check and routine
-            if any([button in keys_pressed for button in adjustment_buttons]):
-                old_alpha = copy(self.alpha)
-                # color adjustment:
-                if keys_pressed[0] == adjustment_buttons[0]:
-                    alpha = old_alpha + adjustment_value
-                elif keys_pressed[0] == adjustment_buttons[1]:
-                    alpha = old_alpha - adjustment_value
-                    
-                if alpha >= self.gamma:
-                    alpha = self.gamma
-                if alpha <=0:
-                    alpha = 0
-
-                beta = self.beta_polynomial(alpha)
-                red_color_adj = colors.Color(
-                    np.array([self.gamma, alpha, 0]), space="rgb1"
-                )
-                green_color_adj = colors.Color(
-                    beta * np.array([alpha, self.gamma, 0]), space="rgb1"
-                )
-
-                self.colors = {"red": red_color_adj, "green": green_color_adj}
-                self.alpha = alpha
-
-                self._adjust_background_color(alpha = alpha, kappa_polynomial=kappa_polynomial)
-                self._adjust_processed_stimuli(seed = SEED)
+            # adjustment check and routine (all queued key events, held keys accelerate)
+            alpha_change = accelerator.get_change(keys_pressed)
+            if alpha_change != 0:
+                requested_alpha = requested_alpha + alpha_change
+                if requested_alpha >= self.gamma:
+                    requested_alpha = self.gamma
+                if requested_alpha <=0:
+                    requested_alpha = 0
+                # steps accumulate in requested_alpha, the grid value is displayed
+                if self.color_table is not None:
+                    displayed_alpha = self.color_table.get_alpha(requested_alpha)
+                else:
+                    displayed_alpha = requested_alpha
+
+                # only the latest request is kept
+                prefetcher.retain(alphas=[displayed_alpha])
+                prefetcher.prefetch(alphas=[displayed_alpha], oris=[self.ori])
+
+            if displayed_alpha != self.alpha:
+                processed_images = prefetcher.poll(alpha=displayed_alpha, ori=self.ori)
+                if processed_images is not None:
+                    self._swap_stimuli(
+                        alpha=displayed_alpha,
+                        processed_images=processed_images,
+                        kappa_polynomial=kappa_polynomial,
+                    )
 
             if (iframe//8)%2 == 0:
-                for visual_object in (self.supporting_visuals + self.stimuli + self.dichoptic_canvas):
-                    visual_object.draw()
+                draw_lists["stimulus_on"].draw()
             else:
-                for visual_object in (self.supporting_visuals + self.dichoptic_canvas):
-                    visual_object.draw()
+                draw_lists["stimulus_off"].draw()
 
             if iframe == last_frame:
                 break
             self.window.flip()
 
+        accelerator.close()
+        prefetcher.close()
+        # the confirmed alpha is the one displayed at termination
+        alpha = self.alpha
         self.info["terminated_at"] = last_frame
         self.info["final_alpha"] = alpha
         random.seed(None)
 
         return alpha
+
+
+class Trial_Factory:
+    """
+    Creating the trials of an experiment from templates.
+
+    Pixel geometry, frame color, durations and the dichoptic canvas
+    (frames and fixation crosses, shared by all trials) are resolved once
+    from the parameters; every trial is then created with only its
+    trial-specific arguments. The construction time of every trial is
+    recorded in `construction_times` (seconds); their summary is saved in
+    the timeline log of every planned block and logged for the session.
+    """
+
+    def __init__(
+        self,
+        window: visual.Window,
+        params: Parameters,
+        beta_polynomial: np.poly1d,
+        color_table: Color_Table | None = None,
+    ):
+        self.window = window
+        self.params = params
+
+        self.square_size = params.square_size__px
+        self.inter_square_distance = params.inter_square_distance__px
+        self.fixation_cross_size = params.fixation_cross_size__px
+        self.frame_color = params.frame_color
+        self.frame_thickness = params.visual_params["frame_thickness__percent"]
+        self.gamma = params.visual_params["full_saturation_value"]
+
+        self.trial_duration = params.exp_trial_params["trial_duration__frames"]
+        self.stimulus_duration = params.exp_trial_params["stimulus_duration__frames"]
+        self.stimulus_onset_limits = params.stimulus_onset_limits__frames
+        self.iti_duration_limits = params.iti_duration_limits__frames
+        self.inter_interval_duration = params.exp_trial_params[
+            "inter_interval_duration__frames"
+        ]
+        self.stimulus_source = params.stimuli_codes["gabor"]
+
+        self.dichoptic_canvas = generate_dichoptic_canvas(
+            window=window,
+            square_size=self.square_size,
+            inter_square_distance=self.inter_square_distance,
+            frame_color=self.frame_color,
+            frame_thickness=self.frame_thickness,
+            fixation_cross_size=self.fixation_cross_size,
+        )
+
+        self.beta_polynomial = beta_polynomial
+        self.color_table = color_table
+        self.construction_times = []
+
+    @property
+    def geometry(self) -> dict:
+        """Arguments shared by all dichoptic trials"""
+        return {
+            "window": self.window,
+            "square_size": self.square_size,
+            "inter_square_distance": self.inter_square_distance,
+            "frame_color": self.frame_color,
+            "frame_thickness": self.frame_thickness,
+            "fixation_cross_size": self.fixation_cross_size,
+        }
+
+    def set_calibration(self, beta_polynomial: np.poly1d, color_table: Color_Table):
+        self.beta_polynomial = beta_polynomial
+        self.color_table = color_table
+
+    def draw_stimulus_onset(self) -> int:
+        return random.randint(*self.stimulus_onset_limits)
+
+    def draw_iti_duration(self) -> int:
+        return random.randint(*self.iti_duration_limits)
+
+    def get_dcm_trial(
+        self,
+        index: str,
+        data_folder: Path,
+        alpha: float,
+        color_mode: str,
+        stimulus_orientation: str,
+        stimulus_onset: int,
+        stimulus_duration: int | None = None,
+        max_trial_duration: int | None = None,
+        detection_judgement_routine: dict | None = None,
+        discrimination_judgement_routine: dict | None = None,
+        termination_buttons: list | None = None,
+        trial_class: type = DCM_Trial,
+        **trial_kwargs,
+    ) -> DCM_Trial:
+        """`trial_kwargs` are passed on to `trial_class` (e.g. Two_Interval_DCM_Trial)"""
+        start = time.perf_counter()
+        trial = trial_class(
+            **trial_kwargs,
+            index=index,
+            data_folder=data_folder,
+            **self.geometry,
+            max_trial_duration=(
+                self.trial_duration if max_trial_duration is None else max_trial_duration
+            ),
+            stimulus_source=self.stimulus_source,
+            stimulus_duration=(
+                self.stimulus_duration if stimulus_duration is None else stimulus_duration
+            ),
+            stimulus_onset=stimulus_onset,
+            detection_judgement_routine=detection_judgement_routine,
+            discrimination_judgement_routine=discrimination_judgement_routine,
+            termination_buttons=termination_buttons,
+            color_mode=color_mode,
+            stimulus_orientation=stimulus_orientation,
+            gamma=self.gamma,
+            alpha=alpha,
+            beta_polynomial=self.beta_polynomial,
+            color_table=self.color_table,
+            dichoptic_canvas=self.dichoptic_canvas,
+        )
+        self.construction_times.append(time.perf_counter() - start)
+        return trial
+
+    def get_stereo_trial(
+        self,
+        index: str,
+        stimulus_index: str,
+        data_folder: Path,
+        stimulus_source: list,
+        termination_buttons: list,
+    ) -> Stereo_Trial:
+        start = time.perf_counter()
+        trial = Stereo_Trial(
+            index=index,
+            stimulus_index=stimulus_index,
+            data_folder=data_folder,
+            **self.geometry,
+            max_trial_duration=self.trial_duration,
+            stimulus_source=stimulus_source,
+            termination_buttons=termination_buttons,
+            dichoptic_canvas=self.dichoptic_canvas,
+        )
+        self.construction_times.append(time.perf_counter() - start)
+        return trial
+
+    def get_inter_trial_interval(
+        self, index: str, data_folder: Path, duration: int | None = None
+    ) -> Inter_Trial_Interval:
+        start = time.perf_counter()
+        iti = Inter_Trial_Interval(
+            index=index,
+            data_folder=data_folder,
+            duration=self.draw_iti_duration() if duration is None else duration,
+            **self.geometry,
+            dichoptic_canvas=self.dichoptic_canvas,
+        )
+        self.construction_times.append(time.perf_counter() - start)
+        return iti
+
+    def get_construction_stats(self, start: int = 0) -> dict:
+        """Summary of the construction times from the `start`-th trial on"""
+        construction_times = self.construction_times[start:]
+        if len(construction_times) == 0:
+            return {"n_trials": 0, "mean__s": None, "max__s": None}
+        return {
+            "n_trials": len(construction_times),
+            "mean__s": float(np.mean(construction_times)),
+            "max__s": float(np.max(construction_times)),
+        }